@@ -3,6 +3,10 @@ from django.apps import AppConfig
 class MyAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'friendly_solar_app'
+    # Keep the label the app was created with, so the existing myapp_* tables,
+    # migration history and content types stay in use
+    label = 'myapp'
 
     def ready(self):
+        import friendly_solar_app.database
         import friendly_solar_app.signals
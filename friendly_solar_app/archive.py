@@ -0,0 +1,95 @@
+import pandas as pd
+from django.db import transaction
+from django.db.models import Avg
+from itertools import islice
+from . import climatology
+from .models import HistoricalIrradiance
+
+
+BATCH_SIZE = 1000
+VARIABLES = ["direct_normal_irradiance", "direct_radiation"]
+
+
+def archive_queryset(latitude, longitude):
+    """
+    Archived hourly irradiance of the climatology cell covering a location.
+
+    The archive is stored once per cell (see climatology.snap), so nearby users share it.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longitude (float): Longitude of the location.
+
+    Returns:
+        QuerySet: HistoricalIrradiance rows of the cell.
+    """
+    latitude, longitude = climatology.snap(latitude, longitude)
+    return HistoricalIrradiance.objects.filter(latitude=latitude, longitude=longitude)
+
+
+def is_archived(latitude, longitude):
+    """Check whether the cell covering a location has been archived with every variable."""
+    # Cells archived before direct_radiation was stored have to be fetched again
+    return archive_queryset(latitude, longitude).filter(direct_radiation__isnull=False).exists()
+
+
+def archived_mean(latitude, longitude):
+    """
+    Mean archived direct normal irradiance for a location.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longitude (float): Longitude of the location.
+
+    Returns:
+        float: Mean irradiance, or None when the cell has not been archived yet.
+    """
+    archive = archive_queryset(latitude, longitude)
+    if not archive.exists():
+        return None
+    return archive.aggregate(mean=Avg("direct_normal_irradiance"))["mean"]
+
+
+def load_archive(latitude, longitude):
+    """
+    Load the archive of the cell covering a location.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longitude (float): Longitude of the location.
+
+    Returns:
+        pandas.DataFrame: Hourly irradiance in the format of utils.fetch_archive, empty when not archived.
+    """
+    rows = archive_queryset(latitude, longitude).order_by("date", "hour").values_list("date", "hour", *VARIABLES)
+    frame = pd.DataFrame.from_records(rows, columns=["date", "hour", *VARIABLES])
+    data = pd.DataFrame({"time": frame["date"].astype(str) + "T" + frame["hour"].astype(str).str[:5]})
+    for variable in VARIABLES:
+        data[variable] = frame[variable].astype(float)
+    return data
+
+
+def store_archive(latitude, longitude, data):
+    """
+    Store fetched hourly irradiance as the archive of the cell covering a location.
+
+    Meant for background jobs (see the compute_climatology command): a full archive is
+    over 100k rows and holds the database write lock while it is stored.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longitude (float): Longitude of the location.
+        data (pandas.DataFrame): Hourly irradiance as returned by utils.fetch_archive.
+    """
+    latitude, longitude = climatology.snap(latitude, longitude)
+    times = pd.to_datetime(data["time"])
+    rows = (
+        HistoricalIrradiance(latitude=latitude, longitude=longitude, date=moment.date(), hour=moment.time(),
+                             **{variable: None if pd.isna(value) else float(value) for variable, value in zip(VARIABLES, values)})
+        for moment, *values in zip(times, *(data[variable] for variable in VARIABLES))
+    )
+    with transaction.atomic():
+        HistoricalIrradiance.objects.filter(latitude=latitude, longitude=longitude).delete()
+        # bulk_create materializes its input, so feed it one batch at a time
+        while batch := list(islice(rows, BATCH_SIZE)):
+            HistoricalIrradiance.objects.bulk_create(batch)
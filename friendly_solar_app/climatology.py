@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from . import utils
+from .models import ClimatologyCell
+
+
+QUANTILES = (0.1, 0.5, 0.9)
+# The hourly bands are shown next to the forecast in the planner, so they use its variable;
+# the yearly sums feed the savings estimate, which is based on direct normal irradiance
+BAND_VARIABLE = utils.FORECAST_VARIABLE
+YEARLY_VARIABLE = "direct_normal_irradiance"
+SHAPE = (366, 24, len(QUANTILES))
+WINDOW_DAYS = 7
+MIN_HOURS_PER_YEAR = 8000
+
+
+def snap(latitude, longitude, spacing=None):
+    """
+    Snap a location to the centre of its climatology cell.
+
+    Cells share the spacing of the forecast grid, so nearby users share one cell.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longitude (float): Longitude of the location.
+        spacing (float): Cell size in degrees. Default is settings.FORECAST_GRID_SPACING.
+
+    Returns:
+        tuple: Latitude and longitude of the cell.
+    """
+    spacing = spacing or settings.FORECAST_GRID_SPACING
+    return round(round(latitude / spacing) * spacing, 4), round(round(longitude / spacing) * spacing, 4)
+
+
+def hourly_matrix(data, variable):
+    """
+    Arrange hourly irradiance as a (day of year, hour, year) array.
+
+    Args:
+        data (pandas.DataFrame): Hourly irradiance as returned by utils.fetch_archive.
+        variable (str): Column of data to arrange.
+
+    Returns:
+        numpy.ndarray: Irradiance, NaN where missing (e.g. day 366 of common years).
+    """
+    times = pd.to_datetime(data["time"])
+    years = times.dt.year.to_numpy()
+    matrix = np.full((366, 24, years.max() - years.min() + 1), np.nan)
+    matrix[times.dt.dayofyear.to_numpy() - 1, times.dt.hour.to_numpy(), years - years.min()] = \
+        data[variable].to_numpy(dtype=float)
+    return matrix
+
+
+def compute_quantiles(data, window_days=WINDOW_DAYS, variable=BAND_VARIABLE):
+    """
+    Per-(day of year, hour) irradiance quantiles.
+
+    A single day only has one sample per archived year, so each day pools the
+    samples of the surrounding window_days on both sides.
+
+    Args:
+        data (pandas.DataFrame): Hourly irradiance as returned by utils.fetch_archive.
+        window_days (int): Half-width of the pooling window in days.
+        variable (str): Column of data to summarize. Default is BAND_VARIABLE.
+
+    Returns:
+        numpy.ndarray: float32 array of shape (366, 24, len(QUANTILES)).
+    """
+    matrix = hourly_matrix(data, variable)
+    pooled = np.concatenate([np.roll(matrix, offset, axis=0) for offset in range(-window_days, window_days + 1)],
+                            axis=2)
+    quantiles = np.nanquantile(pooled, QUANTILES, axis=2)
+    return np.moveaxis(quantiles, 0, -1).astype(np.float32)
+
+
+def compute_yearly_quantiles(data, variable=YEARLY_VARIABLE):
+    """Quantiles of the yearly irradiance sum (Wh/m2) over the complete archived years."""
+    values = data[variable]
+    years = pd.to_datetime(data["time"]).dt.year
+    totals = values.groupby(years).agg(["sum", "count"])
+    totals = totals[totals["count"] >= MIN_HOURS_PER_YEAR]["sum"]
+    if totals.empty:
+        return (None,) * len(QUANTILES)
+    return tuple(float(value) for value in np.quantile(totals, QUANTILES))
+
+
+def store_cell(latitude, longitude, data):
+    """
+    Compute and store the climatology of one cell.
+
+    Args:
+        latitude (float): Latitude of the cell.
+        longitude (float): Longitude of the cell.
+        data (pandas.DataFrame): Hourly irradiance archive of the cell.
+
+    Returns:
+        ClimatologyCell: The stored cell.
+    """
+    yearly_p10, yearly_p50, yearly_p90 = compute_yearly_quantiles(data)
+    cell, _ = ClimatologyCell.objects.update_or_create(latitude=latitude, longitude=longitude, defaults={
+        "quantiles": compute_quantiles(data).tobytes(),
+        "yearly_p10": yearly_p10,
+        "yearly_p50": yearly_p50,
+        "yearly_p90": yearly_p90,
+    })
+    return cell
+
+
+def get_cell(latitude, longitude):
+    """Fetch the climatology cell covering a location, or None when it has not been computed."""
+    if latitude is None or longitude is None:
+        return None
+    latitude, longitude = snap(latitude, longitude)
+    return ClimatologyCell.objects.filter(latitude=latitude, longitude=longitude).first()
+
+
+def get_bands(cell):
+    """Decode the quantile array of a cell."""
+    if cell is None:
+        return None
+    return np.frombuffer(cell.quantiles, dtype=np.float32).reshape(SHAPE)
+
+
+def band_at(bands, date, hour):
+    """
+    Look up the quantiles for a date and hour.
+
+    Args:
+        bands (numpy.ndarray): Array returned by get_bands.
+        date (datetime.date): Date of the hour.
+        hour (datetime.time): Hour of the day.
+
+    Returns:
+        tuple: Irradiance quantiles in the order of QUANTILES.
+    """
+    return tuple(float(value) for value in bands[date.timetuple().tm_yday - 1, hour.hour])
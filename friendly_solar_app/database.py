@@ -0,0 +1,114 @@
+import queue
+import threading
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from time import monotonic
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Apply the SQLITE_PRAGMAS settings to every new SQLite connection.
+
+    Args:
+        sender: The sender of the signal.
+        connection: The new database connection.
+        **kwargs: Additional keyword arguments.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+class WriteJob:
+    """A queued write and the outcome the submitting thread waits for."""
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class CoalescingWriter:
+    """
+    Single background thread that applies queued writes in batches.
+
+    SQLite allows one writer at a time, so instead of many sessions competing for the
+    database lock, every session hands its write to this thread. Jobs that arrive while
+    a batch is being collected are written together, in one call to write_batch.
+
+    Args:
+        write_batch (callable): Writes a list of items and returns one result per item.
+        max_batch (int): Maximum number of jobs written together.
+        max_delay (float): Seconds to wait for more jobs before writing a batch.
+    """
+
+    def __init__(self, write_batch, max_batch=50, max_delay=0.05):
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, item, timeout=None):
+        """Queue an item and block until it has been written, returning its result."""
+        self.start()
+        job = WriteJob(item)
+        self.queue.put(job)
+        if not job.done.wait(timeout):
+            raise TimeoutError("Write was not completed in time.")
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="coalescing-writer", daemon=True)
+                self.thread.start()
+
+    def collect(self):
+        """Wait for a job, then gather the ones arriving within max_delay."""
+        jobs = [self.queue.get()]
+        deadline = monotonic() + self.max_delay
+        while len(jobs) < self.max_batch:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return jobs
+
+    def write(self, jobs):
+        try:
+            results = self.write_batch([job.item for job in jobs])
+            for job, result in zip(jobs, results):
+                job.result = result
+        except Exception as e:
+            if len(jobs) == 1:
+                jobs[0].error = e
+                return
+            # Retry one by one so a single bad job does not fail the others
+            for job in jobs:
+                self.write([job])
+
+    def run(self):
+        while True:
+            jobs = self.collect()
+            # The thread outlives requests, so like a request it drops a broken or expired
+            # connection before and after each batch instead of failing on it forever
+            close_old_connections()
+            try:
+                self.write(jobs)
+            finally:
+                close_old_connections()
+                for job in jobs:
+                    job.done.set()
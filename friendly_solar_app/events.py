@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from django.core.handlers.asgi import ASGIRequest
+
+
+KEEPALIVE_SECONDS = 15
+# Django < 5.0 does not notice client disconnects during a streaming response, so a stream
+# ends on its own after this long and EventSource reconnects after RETRY_MILLISECONDS
+MAX_LIFETIME_SECONDS = 300
+RETRY_MILLISECONDS = 1000
+QUEUE_SIZE = 100
+PLANNER_FIELDS = ["id", "date", "hour", "predictions", "energy_produced"]
+DAY_FIELDS = ["date", "total_produced", "total_consumed", "surplus"]
+
+# Subscribers live in the process serving the ASGI application, so events published by
+# forecast refreshes in other processes (e.g. management commands) are not delivered.
+_subscribers = defaultdict(set)
+_lock = threading.Lock()
+
+
+def format_event(event, data):
+    """Encode a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def supports_streaming(request):
+    """
+    Check whether a request is served over ASGI.
+
+    Under WSGI an infinite event stream would be collected into a list and pin a worker
+    forever, so pages only subscribe to events when this is True.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def has_subscribers(user_id):
+    """Check whether a user has connected clients, so payloads are only built when someone listens."""
+    with _lock:
+        return bool(_subscribers.get(user_id))
+
+
+def publish(user_id, event, data):
+    """
+    Notify every connected client of a user. Safe to call from any thread.
+
+    Args:
+        user_id (int): Id of the user whose clients are notified.
+        event (str): Event name, e.g. "planner" or "savings".
+        data: JSON-serializable payload.
+    """
+    with _lock:
+        subscribers = list(_subscribers.get(user_id, ()))
+    if not subscribers:
+        return
+    message = format_event(event, data)
+    for loop, queue in subscribers:
+        loop.call_soon_threadsafe(deliver, queue, message)
+
+
+def deliver(queue, message):
+    # A client that stopped reading misses events rather than growing the queue
+    if not queue.full():
+        queue.put_nowait(message)
+
+
+def planner_delta(weekly_planners, daily_summaries=()):
+    """
+    Compact payload with only the given planner hours and days.
+
+    Hours are rows in the order of PLANNER_FIELDS, days in the order of DAY_FIELDS.
+    Energy is computed from weekly_planner.user.userprofile, so callers should pass
+    rows with the user and profile already cached.
+    """
+    return {
+        "fields": PLANNER_FIELDS,
+        "rows": [
+            [weekly_planner.id, str(weekly_planner.date), str(weekly_planner.hour),
+             weekly_planner.predictions, weekly_planner.get_energy_produced()]
+            for weekly_planner in weekly_planners
+        ],
+        "day_fields": DAY_FIELDS,
+        "days": [
+            [str(summary.date), summary.total_produced, summary.total_consumed, summary.surplus]
+            for summary in daily_summaries
+        ],
+    }
+
+
+async def stream(user_id, max_lifetime=MAX_LIFETIME_SECONDS):
+    """
+    Yield the events of a user as they are published, with periodic keepalive comments.
+
+    The stream ends after max_lifetime seconds, so the subscription of a closed tab is
+    dropped at the latest then; open pages reconnect transparently.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_lifetime
+    subscriber = (loop, asyncio.Queue(maxsize=QUEUE_SIZE))
+    with _lock:
+        _subscribers[user_id].add(subscriber)
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n: connected\n\n"
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                yield await asyncio.wait_for(subscriber[1].get(), min(KEEPALIVE_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                if loop.time() < deadline:
+                    yield ": keepalive\n\n"
+    finally:
+        with _lock:
+            _subscribers[user_id].discard(subscriber)
+            if not _subscribers[user_id]:
+                del _subscribers[user_id]
@@ -0,0 +1,185 @@
+import csv
+import io
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from itertools import islice
+from .models import HistoricalIrradiance, WeeklyPlanner
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+CHUNK_SIZE = 2000
+
+PLANNER_COLUMNS = ["username", "date", "hour", "predictions", "azimuth", "elevation", "energy_produced", "energy_consumed"]
+IRRADIANCE_COLUMNS = ["latitude", "longitude", "date", "hour", "direct_normal_irradiance", "direct_radiation"]
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parquet_available():
+    """Check whether the optional pyarrow dependency needed for Parquet is installed."""
+    return pa is not None
+
+
+def parse_export_date(value):
+    """
+    Parse an optional YYYY-MM-DD export bound.
+
+    Raises:
+        ValueError: When the value is not a valid date.
+    """
+    if not value:
+        return None
+    # parse_date returns None for malformed dates and raises ValueError for impossible ones
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"{value!r} is not a date.")
+    return parsed
+
+
+def planner_queryset(users=None, start=None, end=None):
+    """Weekly planner rows of the given users (all users when None) within an optional date range."""
+    queryset = WeeklyPlanner.objects.all()
+    if users is not None:
+        queryset = queryset.filter(user__in=users)
+    if start is not None:
+        queryset = queryset.filter(date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date__lte=end)
+    return queryset
+
+
+def irradiance_queryset(latitude=None, longitude=None, start=None, end=None):
+    """Archived hourly irradiance, optionally for one location and within a date range."""
+    queryset = HistoricalIrradiance.objects.all()
+    if latitude is not None and longitude is not None:
+        queryset = queryset.filter(latitude=latitude, longitude=longitude)
+    if start is not None:
+        queryset = queryset.filter(date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date__lte=end)
+    return queryset
+
+
+def planner_rows(queryset):
+    """Yield weekly planner rows with computed production and consumption, fetched in chunks."""
+    queryset = (queryset.select_related("user__userprofile")
+                .annotate(energy_consumed=Sum("appliances__energy_consumption"))
+                .order_by("user_id", "date", "hour"))
+    for weekly_planner in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            weekly_planner.user.username,
+            weekly_planner.date,
+            weekly_planner.hour,
+            weekly_planner.predictions,
+            weekly_planner.azimuth,
+            weekly_planner.elevation,
+            weekly_planner.get_energy_produced(),
+            weekly_planner.energy_consumed or 0.0,
+        ]
+
+
+def irradiance_rows(queryset):
+    """Yield archived irradiance rows, fetched in chunks."""
+    queryset = queryset.order_by("latitude", "longitude", "date", "hour").values_list(*IRRADIANCE_COLUMNS)
+    yield from queryset.iterator(chunk_size=CHUNK_SIZE)
+
+
+class Echo:
+    """File-like object that hands back what is written, so csv.writer output can be streamed."""
+
+    def write(self, value):
+        return value
+
+
+class ParquetSink(io.RawIOBase):
+    """Writable buffer that is drained after every row group, so the Parquet file is never held in memory."""
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def stream_csv(columns, rows):
+    """Yield a CSV document line by line."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def parquet_schema(columns):
+    """Explicit Parquet schema, so that every chunk is written with the same column types."""
+    types = {
+        "username": pa.string(),
+        "date": pa.date32(),
+        "hour": pa.time64("us"),
+    }
+    return pa.schema([(column, types.get(column, pa.float64())) for column in columns])
+
+
+def stream_parquet(columns, rows):
+    """Yield a Parquet document one row group (CHUNK_SIZE rows) at a time."""
+    schema = parquet_schema(columns)
+    sink = ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+    rows = iter(rows)
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        table = pa.Table.from_pydict({column: [row[index] for row in chunk] for index, column in enumerate(columns)},
+                                     schema=schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream(columns, rows, export_format):
+    """Yield the rows encoded in the requested format."""
+    if export_format == "parquet":
+        return stream_parquet(columns, rows)
+    return stream_csv(columns, rows)
+
+
+def streaming_response(name, columns, rows, export_format):
+    """
+    Build a streaming download of the rows.
+
+    Args:
+        name (str): Base name of the downloaded file.
+        columns (list): Column names.
+        rows (iterable): Rows to export.
+        export_format (str): "csv" or "parquet".
+
+    Returns:
+        django.http.StreamingHttpResponse: The download.
+    """
+    content_type, extension = FORMATS[export_format]
+    response = StreamingHttpResponse(stream(columns, rows, export_format), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{name}.{extension}"'
+    return response
@@ -0,0 +1,131 @@
+import joblib
+import numpy as np
+import os
+import pandas as pd
+from django.conf import settings
+from sklearn.preprocessing import StandardScaler
+from . import utils
+
+
+FEATURE_COLUMNS = ["direct_radiation", "elevation", "azimuth", "air_mass", "hour_sin", "hour_cos", "day_sin", "day_cos"]
+# Air mass is infinite at night; cap it so the scaler sees finite values
+MAX_AIR_MASS = 40.0
+
+_cache = {"mtime": None, "pipeline": None}
+
+
+def add_solar_geometry(frame, latitude, longitude, time_zone):
+    """
+    Add solar elevation, azimuth and air mass columns to a forecast frame, for all rows at once.
+
+    Args:
+        frame (pandas.DataFrame): Forecast with a time column in local time ("%Y-%m-%dT%H:%M").
+        latitude (float or array-like): Latitude of the location, or one per row.
+        longitude (float or array-like): Longitude of the location, or one per row.
+        time_zone (float or array-like): UTC offset in hours, or one per row.
+
+    Returns:
+        pandas.DataFrame: Copy of the frame with elevation, azimuth and air_mass columns.
+    """
+    times = pd.to_datetime(frame["time"])
+    day_of_year = times.dt.dayofyear.to_numpy() - 1
+    local_time = times.dt.hour.to_numpy() + times.dt.minute.to_numpy() / 60
+    local_solar_time = utils.calculate_local_solar_time_array(local_time, np.asarray(time_zone, dtype=float),
+                                                              np.asarray(longitude, dtype=float), day_of_year)
+    elevation, azimuth, air_mass = utils.calculate_solar_geometry(day_of_year, local_solar_time,
+                                                                  np.asarray(latitude, dtype=float))
+    return frame.assign(elevation=elevation, azimuth=azimuth, air_mass=air_mass)
+
+
+def build_features(frame):
+    """
+    Build the model input columns from a forecast frame with solar geometry.
+
+    Args:
+        frame (pandas.DataFrame): Frame returned by add_solar_geometry.
+
+    Returns:
+        pandas.DataFrame: Unscaled features in the order of FEATURE_COLUMNS.
+    """
+    times = pd.to_datetime(frame["time"])
+    hour = 2 * np.pi * times.dt.hour.to_numpy() / 24
+    day = 2 * np.pi * (times.dt.dayofyear.to_numpy() - 1) / 365
+    return pd.DataFrame({
+        "direct_radiation": frame["direct_radiation"].to_numpy(dtype=float),
+        "elevation": frame["elevation"].to_numpy(dtype=float),
+        "azimuth": frame["azimuth"].to_numpy(dtype=float),
+        "air_mass": np.minimum(frame["air_mass"].to_numpy(dtype=float), MAX_AIR_MASS),
+        "hour_sin": np.sin(hour),
+        "hour_cos": np.cos(hour),
+        "day_sin": np.sin(day),
+        "day_cos": np.cos(day),
+    }, index=frame.index)[FEATURE_COLUMNS]
+
+
+class FeaturePipeline:
+    """
+    Feature construction and scaling shared by the interactive and batch paths.
+
+    The scaler is fitted once (see the fit_feature_scaler command), persisted with joblib
+    and reused by every call to transform.
+    """
+
+    def __init__(self, scaler=None):
+        self.scaler = scaler or StandardScaler()
+
+    def partial_fit(self, frame):
+        """Update the scaler with one chunk of frames, so large histories fit in constant memory."""
+        features = build_features(frame).dropna()
+        if not features.empty:
+            self.scaler.partial_fit(features.to_numpy())
+        return self
+
+    def transform(self, frame):
+        """
+        Build and scale the model inputs of a frame.
+
+        Args:
+            frame (pandas.DataFrame): Frame returned by add_solar_geometry.
+
+        Returns:
+            numpy.ndarray: Scaled features of shape (rows, len(FEATURE_COLUMNS)).
+        """
+        return self.scaler.transform(build_features(frame).to_numpy())
+
+    def save(self, path=None):
+        path = path or settings.FEATURE_PIPELINE_PATH
+        temporary_path = path + ".tmp"
+        joblib.dump(self.scaler, temporary_path)
+        os.replace(temporary_path, path)
+
+
+def get_pipeline(path=None):
+    """
+    Load the fitted pipeline, reusing the in-memory copy until the file changes.
+
+    Returns:
+        FeaturePipeline: The fitted pipeline, or None when no scaler has been fitted yet.
+    """
+    path = path or settings.FEATURE_PIPELINE_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    if _cache["mtime"] != mtime:
+        _cache["pipeline"] = FeaturePipeline(joblib.load(path))
+        _cache["mtime"] = mtime
+    return _cache["pipeline"]
+
+
+def model_inputs(frame):
+    """
+    Scaled model inputs of a frame with solar geometry, using the persisted pipeline.
+
+    Entry point for the irradiance model, which is not part of this showcase (see
+    utils.predict_location); nothing in the app calls it until the model is added.
+    """
+    pipeline = get_pipeline()
+    if pipeline is None:
+        raise RuntimeError("The feature scaler has not been fitted, run `python manage.py fit_feature_scaler`.")
+    return pipeline.transform(frame)
@@ -1,3 +1,4 @@
+from datetime import time
 from django import forms
 from django.core.validators import MaxValueValidator, MinValueValidator
 from .models import UserProfile, Appliance, WeeklyPlanner
@@ -20,6 +21,12 @@ class UserProfileForm(forms.ModelForm):
         model = UserProfile
         fields = ['latitude', 'longitude']
 
+    def save(self, commit=True):
+        # A forecast fetched for the old coordinates must not be reused
+        if 'latitude' in self.changed_data or 'longitude' in self.changed_data:
+            self.instance.forecast_issued_at = None
+        return super().save(commit)
+
 
 class ApplianceForm(forms.ModelForm):
     class Meta:
@@ -27,3 +34,39 @@ class ApplianceForm(forms.ModelForm):
         fields = ['name', 'energy_consumption']
 
 
+class RecurringApplianceForm(forms.Form):
+    WEEKDAYS = [
+        (1, 'Monday'),
+        (2, 'Tuesday'),
+        (3, 'Wednesday'),
+        (4, 'Thursday'),
+        (5, 'Friday'),
+        (6, 'Saturday'),
+        (7, 'Sunday'),
+    ]
+
+    appliance = forms.ModelChoiceField(queryset=Appliance.objects.none())
+    weekdays = forms.TypedMultipleChoiceField(choices=WEEKDAYS, coerce=int, widget=forms.CheckboxSelectMultiple)
+    start_hour = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time'}))
+    duration = forms.IntegerField(
+        validators=[
+            MinValueValidator(1),
+            MaxValueValidator(24)
+        ]
+    )
+
+    def __init__(self, user, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['appliance'].queryset = Appliance.objects.filter(user=user)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_hour = cleaned_data.get('start_hour')
+        duration = cleaned_data.get('duration')
+        if start_hour is not None and duration is not None and start_hour.hour + duration > 24:
+            raise forms.ValidationError("The appliance has to finish before midnight.")
+        return cleaned_data
+
+    def get_hours(self):
+        start = self.cleaned_data['start_hour'].hour
+        return [time(hour) for hour in range(start, start + self.cleaned_data['duration'])]
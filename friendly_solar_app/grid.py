@@ -0,0 +1,175 @@
+import joblib
+import numpy as np
+import os
+import pandas as pd
+import requests
+from django.conf import settings
+from django.utils import timezone
+from . import quota, utils
+
+
+GRID_VARIABLE = utils.FORECAST_VARIABLE
+BATCH_SIZE = 100
+
+_cache = {"mtime": None, "grid": None}
+
+
+def grid_axes(bounds=None, spacing=None):
+    """
+    Build the latitude and longitude axes of the forecast grid.
+
+    Args:
+        bounds (tuple): (lat_min, lat_max, lon_min, lon_max) of the service region.
+            Default is settings.FORECAST_GRID_BOUNDS.
+        spacing (float): Grid spacing in degrees. Default is settings.FORECAST_GRID_SPACING.
+
+    Returns:
+        tuple: Latitude axis and longitude axis as numpy arrays.
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds or settings.FORECAST_GRID_BOUNDS
+    spacing = spacing or settings.FORECAST_GRID_SPACING
+    latitudes = np.arange(lat_min, lat_max + spacing / 2, spacing)
+    longitudes = np.arange(lon_min, lon_max + spacing / 2, spacing)
+    return latitudes, longitudes
+
+
+def fetch_grid(latitudes, longitudes, days=7):
+    """
+    Fetch the forecast for every cell of the grid, batching many cells per upstream call.
+
+    Args:
+        latitudes (numpy.ndarray): Latitude axis of the grid.
+        longitudes (numpy.ndarray): Longitude axis of the grid.
+        days (int): Number of days to forecast. Default is 7.
+
+    Returns:
+        dict: Grid axes, UTC timestamps, irradiance of shape (lat, lon, time) and issue time.
+    """
+    lat_mesh, lon_mesh = np.meshgrid(latitudes, longitudes, indexing="ij")
+    flat_latitudes = lat_mesh.ravel()
+    flat_longitudes = lon_mesh.ravel()
+
+    values = []
+    times = None
+    for start in range(0, flat_latitudes.size, BATCH_SIZE):
+        batch = slice(start, start + BATCH_SIZE)
+        quota.acquire(quota.BACKGROUND, cost=quota.call_cost(days, locations=flat_latitudes[batch].size))
+        response = requests.get("https://api.open-meteo.com/v1/forecast", params={
+            "latitude": ",".join(f"{value:.4f}" for value in flat_latitudes[batch]),
+            "longitude": ",".join(f"{value:.4f}" for value in flat_longitudes[batch]),
+            "hourly": GRID_VARIABLE,
+            "forecast_days": days,
+            "timezone": "GMT",
+        })
+        response_json = response.json()
+        # A single location comes back as an object, several as a list
+        if isinstance(response_json, dict):
+            response_json = [response_json]
+        for location in response_json:
+            values.append(location["hourly"][GRID_VARIABLE])
+        times = response_json[0]["hourly"]["time"]
+
+    irradiance = np.asarray(values, dtype=float).astype(np.float32)
+    return {
+        "latitudes": latitudes,
+        "longitudes": longitudes,
+        "times": np.asarray(times),
+        "irradiance": irradiance.reshape(latitudes.size, longitudes.size, -1),
+        "issued_at": timezone.now(),
+    }
+
+
+def refresh_grid(path=None, bounds=None, spacing=None, days=None):
+    """
+    Fetch a fresh forecast grid and store it on disk, replacing the previous one atomically.
+
+    Args:
+        path (str): Target file. Default is settings.FORECAST_GRID_PATH.
+        bounds (tuple): Service region, see grid_axes.
+        spacing (float): Grid spacing in degrees, see grid_axes.
+        days (int): Number of days to forecast. Default is settings.FORECAST_GRID_DAYS.
+
+    Returns:
+        dict: The stored grid.
+    """
+    path = path or settings.FORECAST_GRID_PATH
+    latitudes, longitudes = grid_axes(bounds, spacing)
+    grid = fetch_grid(latitudes, longitudes, days or settings.FORECAST_GRID_DAYS)
+
+    temporary_path = path + ".tmp"
+    joblib.dump(grid, temporary_path)
+    os.replace(temporary_path, path)
+    return grid
+
+
+def load_grid(path=None):
+    """Load the stored grid, reusing the in-memory copy until the file changes."""
+    path = path or settings.FORECAST_GRID_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    if _cache["mtime"] != mtime:
+        _cache["grid"] = joblib.load(path)
+        _cache["mtime"] = mtime
+    return _cache["grid"]
+
+
+def covers(grid, latitude, longitude):
+    """Check whether a location lies inside the grid."""
+    latitudes = grid["latitudes"]
+    longitudes = grid["longitudes"]
+    return bool(latitudes[0] <= latitude <= latitudes[-1] and longitudes[0] <= longitude <= longitudes[-1])
+
+
+def interpolate(grid, latitude, longitude):
+    """
+    Bilinearly interpolate the grid at one or many locations.
+
+    Args:
+        grid (dict): Grid as returned by fetch_grid.
+        latitude (float or array-like): Latitude(s) inside the grid.
+        longitude (float or array-like): Longitude(s) inside the grid.
+
+    Returns:
+        numpy.ndarray: Interpolated values of shape (locations, time).
+    """
+    latitude = np.atleast_1d(np.asarray(latitude, dtype=float))
+    longitude = np.atleast_1d(np.asarray(longitude, dtype=float))
+    latitudes = grid["latitudes"]
+    longitudes = grid["longitudes"]
+    values = grid["irradiance"]
+
+    i = np.clip(np.searchsorted(latitudes, latitude, side="right") - 1, 0, latitudes.size - 2)
+    j = np.clip(np.searchsorted(longitudes, longitude, side="right") - 1, 0, longitudes.size - 2)
+    fy = ((latitude - latitudes[i]) / (latitudes[i + 1] - latitudes[i]))[:, None]
+    fx = ((longitude - longitudes[j]) / (longitudes[j + 1] - longitudes[j]))[:, None]
+
+    return (values[i, j] * (1 - fy) * (1 - fx)
+            + values[i + 1, j] * fy * (1 - fx)
+            + values[i, j + 1] * (1 - fy) * fx
+            + values[i + 1, j + 1] * fy * fx)
+
+
+def predict_from_grid(latitude, longitude):
+    """
+    Predict solar radiation for a location from the stored grid, without any upstream call.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longitude (float): Longitude of the location.
+
+    Returns:
+        pandas.DataFrame: Solar radiation predictions in local time, or None when the grid
+        is missing or does not cover the location.
+    """
+    grid = load_grid()
+    if grid is None or not covers(grid, latitude, longitude):
+        return None
+
+    values = interpolate(grid, latitude, longitude)[0]
+    utc_offset = utils.get_utc_offset(utils.get_timezone_name(latitude, longitude))
+    times = pd.to_datetime(grid["times"]) + pd.Timedelta(hours=utc_offset)
+
+    return pd.DataFrame({"time": times.strftime("%Y-%m-%dT%H:%M"), GRID_VARIABLE: values})
@@ -0,0 +1,110 @@
+import calendar
+import numpy as np
+from datetime import date
+from . import utils
+from .models import UserProfile
+
+
+YEARS = 25
+DEGRADATION = 0.005
+ENERGY_PRICE = 0.67
+TARIFF_ESCALATION = 0.03
+DIFFUSE_FRACTION = 0.315
+# Each location needs about 0.5 MB of (day, hour) arrays
+CHUNK_SIZE = 64
+
+
+def profile_efficiency(profile):
+    """Panel efficiency of a profile, or the UserProfile default when it is not set."""
+    if profile.panel_efficiency is None:
+        return UserProfile._meta.get_field("panel_efficiency").default
+    return profile.panel_efficiency
+
+
+def typical_year_energy(latitudes, panel_azimuth, panel_tilt, chunk_size=CHUNK_SIZE):
+    """
+    Clear-sky energy reaching one square metre of panel in a typical (365 day) year.
+
+    Locations are computed chunk_size at a time on (locations, day, hour) arrays, so peak
+    memory stays bounded however many locations are simulated. Hours are in local solar
+    time, so the yearly total does not depend on longitude or time zone.
+
+    Args:
+        latitudes (array-like): Latitudes of the locations.
+        panel_azimuth (float or array-like): Panel azimuth per location in degrees.
+        panel_tilt (float or array-like): Panel elevation (tilt from horizontal) per location in degrees.
+        chunk_size (int): Locations computed at once. Default is CHUNK_SIZE.
+
+    Returns:
+        numpy.ndarray: Energy in kWh/m2 per location.
+    """
+    latitudes = np.asarray(latitudes, dtype=float).ravel()
+    panel_azimuth = np.broadcast_to(np.asarray(panel_azimuth, dtype=float), latitudes.shape)
+    panel_tilt = np.broadcast_to(np.asarray(panel_tilt, dtype=float), latitudes.shape)
+    energy = np.empty(latitudes.size)
+    for start in range(0, latitudes.size, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        energy[chunk] = chunk_energy(latitudes[chunk], panel_azimuth[chunk], panel_tilt[chunk])
+    return energy
+
+
+def chunk_energy(latitudes, panel_azimuth, panel_tilt):
+    """Typical year energy of a chunk of locations, see typical_year_energy."""
+    latitudes = latitudes.reshape(-1, 1, 1)
+    panel_azimuth = np.radians(panel_azimuth).reshape(-1, 1, 1)
+    panel_tilt = np.radians(panel_tilt).reshape(-1, 1, 1)
+    day_of_year = np.arange(365).reshape(1, -1, 1)
+    solar_time = np.arange(24).reshape(1, 1, -1) + 0.5
+
+    elevation, azimuth, air_mass = utils.calculate_solar_geometry(day_of_year, solar_time, latitudes)
+    # Meinel clear-sky model for the direct beam (kW/m2); exp(-inf) takes care of the night
+    beam = utils.calculate_irradiance_array(day_of_year) * 0.7 ** (air_mass ** 0.678)
+
+    elevation = np.radians(elevation)
+    incidence = (np.cos(elevation) * np.sin(panel_tilt) * np.cos(panel_azimuth - np.radians(azimuth))
+                 + np.sin(elevation) * np.cos(panel_tilt))
+    power = beam * np.clip(incidence, 0, None) + beam * DIFFUSE_FRACTION
+    return power.sum(axis=(1, 2))
+
+
+def simulate_lifetime(latitudes, panel_azimuth, panel_tilt, panel_surface, panel_efficiency, years=YEARS,
+                      degradation=DEGRADATION, energy_price=ENERGY_PRICE, tariff_escalation=TARIFF_ESCALATION,
+                      start_year=None):
+    """
+    Simulate the yield and savings of panels over their lifetime, one year at a time.
+
+    The typical year is computed once; every simulated year only scales it by the panel
+    degradation, the number of days in that year and the escalated tariff.
+
+    Args:
+        latitudes (array-like): Latitudes of the locations.
+        panel_azimuth (float or array-like): Panel azimuth in degrees.
+        panel_tilt (float or array-like): Panel elevation (tilt) in degrees.
+        panel_surface (float or array-like): Panel surface in m2.
+        panel_efficiency (float or array-like): Panel efficiency.
+        years (int): Number of years to simulate. Default is 25.
+        degradation (float): Yearly relative loss of panel output. Default is 0.5%.
+        energy_price (float): Energy price per kWh in the first year.
+        tariff_escalation (float): Yearly relative increase of the energy price.
+        start_year (int): First calendar year. Default is the current year.
+
+    Yields:
+        dict: Year, energy (kWh), savings and cumulative savings, as arrays over locations.
+    """
+    start_year = start_year or date.today().year
+    base_energy = (typical_year_energy(latitudes, panel_azimuth, panel_tilt)
+                   * np.asarray(panel_surface, dtype=float) * np.asarray(panel_efficiency, dtype=float))
+
+    cumulative_savings = np.zeros_like(base_energy)
+    for index in range(years):
+        year = start_year + index
+        days = 366 if calendar.isleap(year) else 365
+        energy = base_energy * (1 - degradation) ** index * days / 365
+        savings = energy * energy_price * (1 + tariff_escalation) ** index
+        cumulative_savings = cumulative_savings + savings
+        yield {
+            "year": year,
+            "energy": energy,
+            "savings": savings,
+            "cumulative_savings": cumulative_savings,
+        }
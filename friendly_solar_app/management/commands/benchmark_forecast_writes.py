@@ -0,0 +1,63 @@
+import pandas as pd
+import threading
+from datetime import datetime, timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from time import perf_counter
+from friendly_solar_app.models import WeeklyPlanner
+from friendly_solar_app.signals import forecast_writer, write_predictions
+
+
+class Command(BaseCommand):
+    help = ("Measure forecast write throughput under N concurrent sessions, writing directly "
+            "and through the coalescing writer. Uses temporary users in the configured database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=20, help="Number of concurrent sessions.")
+        parser.add_argument("--hours", type=int, default=168, help="Planner rows written per session.")
+
+    def handle(self, *args, **options):
+        sessions = options["sessions"]
+        hours = options["hours"]
+        users = [User.objects.create_user(username=f"benchmark_user_{index}") for index in range(sessions)]
+        try:
+            for label, write in (("direct", write_predictions),
+                                 ("coalesced", lambda user, frame: forecast_writer.submit((user, frame)))):
+                # Two rounds: the first creates the rows, the second updates all of them
+                for round_number in range(2):
+                    elapsed, errors = self.run_round(users, hours, round_number, write)
+                    rows = (sessions - errors) * hours
+                    self.stdout.write(f"{label:>9} round {round_number + 1}: {rows} rows in {elapsed:.2f}s "
+                                      f"({rows / elapsed:.0f} rows/s), {errors} failed sessions")
+                WeeklyPlanner.objects.filter(user__in=users).delete()
+        finally:
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    def run_round(self, users, hours, round_number, write):
+        start = datetime(2024, 1, 1)
+        errors = []
+        barrier = threading.Barrier(len(users))
+
+        def session(user):
+            frame = pd.DataFrame({
+                "time": [(start + timedelta(hours=hour)).strftime("%Y-%m-%dT%H:%M") for hour in range(hours)],
+                "direct_radiation": [float(hour + round_number) for hour in range(hours)],
+                "azimuth": [180.0] * hours,
+                "elevation": [45.0] * hours,
+            })
+            barrier.wait()
+            try:
+                write(user, frame)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=session, args=(user,)) for user in users]
+        started = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return perf_counter() - started, len(errors)
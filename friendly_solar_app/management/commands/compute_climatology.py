@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from friendly_solar_app import archive, climatology, grid, utils
+from friendly_solar_app.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = ("Compute P10/P50/P90 irradiance climatology for the cells of all user locations or of the whole forecast grid. "
+            "Cells without a stored archive are backfilled from upstream first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grid", action="store_true", help="Compute every cell of the forecast grid.")
+        parser.add_argument("--year-start", type=int, default=2010, help="First year fetched for missing cells.")
+        parser.add_argument("--year-end", type=int, default=2022, help="Last year fetched for missing cells.")
+
+    def handle(self, *args, **options):
+        if options["grid"]:
+            latitudes, longitudes = grid.grid_axes()
+            cells = {climatology.snap(latitude, longitude) for latitude in latitudes for longitude in longitudes}
+        else:
+            locations = UserProfile.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list("latitude", "longitude")
+            cells = {climatology.snap(latitude, longitude) for latitude, longitude in locations}
+
+        for latitude, longitude in sorted(cells):
+            try:
+                if archive.is_archived(latitude, longitude):
+                    data = archive.load_archive(latitude, longitude)
+                else:
+                    data = utils.fetch_archive(latitude, longitude, options["year_start"], options["year_end"])
+                    archive.store_archive(latitude, longitude, data)
+                    self.stdout.write(f"Archived cell ({latitude}, {longitude}).")
+                climatology.store_cell(latitude, longitude, data)
+                self.stdout.write(f"Computed cell ({latitude}, {longitude}).")
+            except Exception as e:
+                self.stderr.write(f"Error computing cell ({latitude}, {longitude}): {e}")
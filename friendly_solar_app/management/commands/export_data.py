@@ -0,0 +1,49 @@
+import argparse
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from friendly_solar_app import exports
+
+
+def date_argument(value):
+    """Parse a YYYY-MM-DD argument, rejecting malformed dates instead of ignoring them."""
+    try:
+        return exports.parse_export_date(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"{e} Use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Stream weekly planner rows or archived hourly irradiance to CSV or Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["planner", "irradiance"])
+        parser.add_argument("--format", choices=sorted(exports.FORMATS), default="csv")
+        parser.add_argument("--output", help="Target file. CSV is written to stdout when omitted.")
+        parser.add_argument("--user", action="append", help="Username to export (planner only, repeatable).")
+        parser.add_argument("--start", type=date_argument, help="First date (YYYY-MM-DD).")
+        parser.add_argument("--end", type=date_argument, help="Last date (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        export_format = options["format"]
+        if export_format == "parquet" and not exports.parquet_available():
+            raise CommandError("Parquet export requires pyarrow.")
+        if export_format == "parquet" and not options["output"]:
+            raise CommandError("Parquet export requires --output.")
+
+        if options["kind"] == "planner":
+            users = User.objects.filter(username__in=options["user"]) if options["user"] else None
+            columns = exports.PLANNER_COLUMNS
+            rows = exports.planner_rows(exports.planner_queryset(users, options["start"], options["end"]))
+        else:
+            columns = exports.IRRADIANCE_COLUMNS
+            rows = exports.irradiance_rows(exports.irradiance_queryset(start=options["start"], end=options["end"]))
+
+        chunks = exports.stream(columns, rows, export_format)
+        if options["output"]:
+            mode = "wb" if export_format == "parquet" else "w"
+            with open(options["output"], mode, newline="" if mode == "w" else None) as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
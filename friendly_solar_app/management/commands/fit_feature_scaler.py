@@ -0,0 +1,33 @@
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from friendly_solar_app import features, utils
+from friendly_solar_app.models import UserProfile, WeeklyPlanner
+
+
+class Command(BaseCommand):
+    help = "Fit the feature scaler on the stored forecasts of all users and persist it for reuse."
+
+    def handle(self, *args, **options):
+        pipeline = features.FeaturePipeline()
+        profiles = UserProfile.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        rows = 0
+        # One user at a time, so memory does not grow with the number of users
+        for profile in profiles.iterator():
+            planner = pd.DataFrame.from_records(
+                WeeklyPlanner.objects.filter(user_id=profile.user_id, date__isnull=False, hour__isnull=False,
+                                             predictions__isnull=False).values_list("date", "hour", "predictions"),
+                columns=["date", "hour", "direct_radiation"])
+            if planner.empty:
+                continue
+            frame = pd.DataFrame({
+                "time": (planner["date"].astype(str) + "T" + planner["hour"].astype(str).str[:5]),
+                "direct_radiation": planner["direct_radiation"],
+            })
+            time_zone = utils.get_utc_offset(utils.get_timezone_name(profile.latitude, profile.longitude))
+            pipeline.partial_fit(features.add_solar_geometry(frame, profile.latitude, profile.longitude, time_zone))
+            rows += len(frame)
+
+        if not rows:
+            raise CommandError("No stored forecasts to fit the scaler on.")
+        pipeline.save()
+        self.stdout.write(self.style.SUCCESS(f"Fitted the feature scaler on {rows} hourly rows."))
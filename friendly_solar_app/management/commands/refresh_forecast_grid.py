@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from friendly_solar_app import grid
+
+
+class Command(BaseCommand):
+    help = "Fetch the coarse forecast grid used for anonymous irradiance requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spacing", type=float, help="Grid spacing in degrees (overrides FORECAST_GRID_SPACING).")
+        parser.add_argument("--days", type=int, help="Number of days to forecast (overrides FORECAST_GRID_DAYS).")
+
+    def handle(self, *args, **options):
+        forecast_grid = grid.refresh_grid(spacing=options["spacing"], days=options["days"])
+        rows, columns, hours = forecast_grid["irradiance"].shape
+        self.stdout.write(self.style.SUCCESS(f"Stored {rows}x{columns} grid cells with {hours} hours each."))
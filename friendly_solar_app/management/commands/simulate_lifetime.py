@@ -0,0 +1,47 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from friendly_solar_app import lifetime
+from friendly_solar_app.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Stream yearly lifetime yield and savings as CSV, for given latitudes or for every configured user profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--latitude", type=float, action="append", help="Latitude to simulate (repeatable).")
+        parser.add_argument("--azimuth", type=float, default=180.0, help="Panel azimuth for --latitude locations.")
+        parser.add_argument("--elevation", type=float, default=35.0, help="Panel elevation for --latitude locations.")
+        parser.add_argument("--surface", type=float, default=1.0, help="Panel surface in m2 for --latitude locations.")
+        parser.add_argument("--efficiency", type=float, default=0.2, help="Panel efficiency for --latitude locations.")
+        parser.add_argument("--years", type=int, default=lifetime.YEARS)
+        parser.add_argument("--degradation", type=float, default=lifetime.DEGRADATION)
+        parser.add_argument("--tariff-escalation", type=float, default=lifetime.TARIFF_ESCALATION)
+
+    def handle(self, *args, **options):
+        if options["latitude"]:
+            labels = [f"{latitude}" for latitude in options["latitude"]]
+            latitudes = options["latitude"]
+            azimuth, elevation = options["azimuth"], options["elevation"]
+            surface, efficiency = options["surface"], options["efficiency"]
+        else:
+            profiles = list(UserProfile.objects.select_related("user").filter(
+                latitude__isnull=False, azimuth__isnull=False, elevation__isnull=False, panel_surface__gt=0))
+            if not profiles:
+                raise CommandError("No user profile has coordinates, panel surface and angles.")
+            labels = [profile.user.username for profile in profiles]
+            latitudes = [profile.latitude for profile in profiles]
+            azimuth = [profile.azimuth for profile in profiles]
+            elevation = [profile.elevation for profile in profiles]
+            surface = [profile.panel_surface for profile in profiles]
+            efficiency = [lifetime.profile_efficiency(profile) for profile in profiles]
+
+        writer = csv.writer(self.stdout, lineterminator="\n")
+        writer.writerow(["location", "year", "energy_kwh", "savings", "cumulative_savings"])
+        simulation = lifetime.simulate_lifetime(latitudes, azimuth, elevation, surface, efficiency,
+                                                years=options["years"], degradation=options["degradation"],
+                                                tariff_escalation=options["tariff_escalation"])
+        for year in simulation:
+            writer.writerows(
+                [label, year["year"], f"{energy:.2f}", f"{savings:.2f}", f"{cumulative:.2f}"]
+                for label, energy, savings, cumulative in zip(labels, year["energy"], year["savings"], year["cumulative_savings"])
+            )
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    # The original migrations of this app are no longer in the tree; databases that
+    # applied them are treated as having applied this one.
+    replaces = [
+        ('myapp', '0001_initial'),
+        ('myapp', '0002_remove_userprofile_avatar_remove_userprofile_bio'),
+        ('myapp', '0003_userprofile_latitude_userprofile_longitude'),
+        ('myapp', '0004_appliance_weeklyplanner'),
+        ('myapp', '0005_remove_weeklyplanner_hour_weeklyplanner_date'),
+        ('myapp', '0006_weeklyplanner_predictions'),
+        ('myapp', '0007_alter_weeklyplanner_appliance'),
+        ('myapp', '0008_weeklyplanner_hour'),
+        ('myapp', '0009_alter_weeklyplanner_date_alter_weeklyplanner_hour'),
+        ('myapp', '0010_appliance_energy_consumption'),
+        ('myapp', '0011_remove_weeklyplanner_appliance_and_more'),
+        ('myapp', '0012_userprofile_panel_surface'),
+        ('myapp', '0013_alter_userprofile_panel_surface'),
+        ('myapp', '0014_userprofile_azimuth_userprofile_elevation'),
+        ('myapp', '0015_weeklyplanner_azimuth_weeklyplanner_elevation'),
+        ('myapp', '0016_userprofile_panel_efficiency'),
+        ('myapp', '0017_appliance_is_public_appliance_user_and_more'),
+        ('myapp', '0018_alter_weeklyplanner_user'),
+    ]
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Appliance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('energy_consumption', models.FloatField(blank=True, null=True)),
+                ('is_public', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WeeklyPlanner',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=None, null=True)),
+                ('hour', models.TimeField(default=None, null=True)),
+                ('predictions', models.FloatField(blank=True, null=True)),
+                ('azimuth', models.FloatField(blank=True, null=True)),
+                ('elevation', models.FloatField(blank=True, null=True)),
+                ('appliances', models.ManyToManyField(to='myapp.appliance')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('azimuth', models.FloatField(blank=True, null=True)),
+                ('elevation', models.FloatField(blank=True, null=True)),
+                ('panel_surface', models.FloatField(blank=True, default=0.0, null=True)),
+                ('panel_efficiency', models.FloatField(blank=True, default=0.2, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
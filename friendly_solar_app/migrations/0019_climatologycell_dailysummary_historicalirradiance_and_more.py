@@ -0,0 +1,91 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('myapp', '0001_squashed_0018_alter_weeklyplanner_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimatologyCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('quantiles', models.BinaryField()),
+                ('yearly_p10', models.FloatField(blank=True, null=True)),
+                ('yearly_p50', models.FloatField(blank=True, null=True)),
+                ('yearly_p90', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_produced', models.FloatField(default=0.0)),
+                ('total_consumed', models.FloatField(default=0.0)),
+                ('peak_hour', models.TimeField(blank=True, null=True)),
+                ('surplus', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HistoricalIrradiance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('date', models.DateField()),
+                ('hour', models.TimeField()),
+                ('direct_normal_irradiance', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='forecast_issued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='appliance',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='weeklyplanner',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='appliance',
+            index=models.Index(fields=['user', 'is_public'], name='appliance_user_public_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='weeklyplanner',
+            constraint=models.UniqueConstraint(fields=('user', 'date', 'hour'), name='unique_weekly_planner_hour'),
+        ),
+        migrations.AddIndex(
+            model_name='historicalirradiance',
+            index=models.Index(fields=['latitude', 'longitude', 'date', 'hour'], name='irradiance_location_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailysummary',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='climatologycell',
+            constraint=models.UniqueConstraint(fields=('latitude', 'longitude'), name='unique_climatology_cell'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysummary',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_summary'),
+        ),
+    ]
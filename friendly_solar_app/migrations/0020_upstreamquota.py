@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_climatologycell_dailysummary_historicalirradiance_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UpstreamQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('day', models.DateField()),
+                ('used_today', models.IntegerField(default=0)),
+                ('tokens', models.FloatField()),
+                ('updated', models.FloatField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def backfill_daily_summaries(apps, schema_editor):
+    # Forecast refreshes only summarize the days they change, so the planner rows written
+    # before DailySummary existed are summarized once here
+    WeeklyPlanner = apps.get_model('myapp', 'WeeklyPlanner')
+    user_ids = list(WeeklyPlanner.objects.values_list('user_id', flat=True).distinct().order_by())
+    if not user_ids:
+        return
+
+    # The energy computation lives on the current models; they match the schema here as long
+    # as no later migration changes UserProfile, WeeklyPlanner or DailySummary
+    from django.contrib.auth.models import User
+    from friendly_solar_app import summaries
+    for user_id in user_ids:
+        summaries.refresh_daily_summaries(User(id=user_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_upstreamquota'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0021_backfill_daily_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalirradiance',
+            name='direct_radiation',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -11,6 +11,7 @@ class UserProfile(models.Model):
     elevation = models.FloatField(blank=True, null=True) 
     panel_surface = models.FloatField(default=0.0, blank=True, null=True)
     panel_efficiency = models.FloatField(default=0.2, blank=True, null=True)
+    forecast_issued_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return f"{self.user.username} - Panel Surface: {self.panel_surface}"
@@ -24,23 +25,35 @@ def get_admin_user():
 
 
 class Appliance(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed through appliance_user_public_idx below, which starts with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     name = models.CharField(max_length=100)
     energy_consumption = models.FloatField(blank=True, null=True)
     is_public = models.BooleanField(default=False) 
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_public'], name='appliance_user_public_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
 
 class WeeklyPlanner(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed through unique_weekly_planner_hour below, which starts with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     appliances = models.ManyToManyField(Appliance)
     date = models.DateField(default=None, null=True)
     hour = models.TimeField(default=None, null=True)
     predictions = models.FloatField(blank=True, null=True) 
     azimuth = models.FloatField(blank=True, null=True) 
     elevation = models.FloatField(blank=True, null=True) 
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'hour'], name='unique_weekly_planner_hour'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {[appliance.name for appliance in self.appliances.all()] or 'None'} - Date: {self.date}"
@@ -54,4 +67,70 @@ class WeeklyPlanner(models.Model):
     def get_energy_produced(self):
         if self.user.userprofile.panel_surface is not None and self.predictions is not None and self.user.userprofile.azimuth is not None and self.user.userprofile.elevation is not None:
             return self.predictions * self.user.userprofile.panel_surface * self.user.userprofile.panel_efficiency * abs(math.cos(math.radians(self.user.userprofile.azimuth) - math.radians(self.azimuth))) * abs(math.sin(math.radians(self.user.userprofile.elevation)) - math.radians(self.elevation)) + self.predictions* 0.315 * self.user.userprofile.panel_efficiency
-        return None
\ No newline at end of file
+        return None
+
+
+class HistoricalIrradiance(models.Model):
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    date = models.DateField()
+    hour = models.TimeField()
+    direct_normal_irradiance = models.FloatField(blank=True, null=True)
+    direct_radiation = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        # Not unique: local hours repeat when clocks go back
+        indexes = [
+            models.Index(fields=['latitude', 'longitude', 'date', 'hour'], name='irradiance_location_idx'),
+        ]
+
+    def __str__(self):
+        return f"({self.latitude}, {self.longitude}) - {self.date} {self.hour}: {self.direct_normal_irradiance}"
+
+
+class ClimatologyCell(models.Model):
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    quantiles = models.BinaryField()
+    yearly_p10 = models.FloatField(blank=True, null=True)
+    yearly_p50 = models.FloatField(blank=True, null=True)
+    yearly_p90 = models.FloatField(blank=True, null=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['latitude', 'longitude'], name='unique_climatology_cell'),
+        ]
+
+    def __str__(self):
+        return f"({self.latitude}, {self.longitude}) - Computed: {self.computed_at}"
+
+
+class DailySummary(models.Model):
+    # Indexed through unique_daily_summary below, which starts with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    date = models.DateField()
+    total_produced = models.FloatField(default=0.0)
+    total_consumed = models.FloatField(default=0.0)
+    peak_hour = models.TimeField(blank=True, null=True)
+    surplus = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_daily_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - Date: {self.date} - Produced: {self.total_produced} - Consumed: {self.total_consumed}"
+
+
+class UpstreamQuota(models.Model):
+    # Token bucket and daily call count of an upstream API, shared by every process
+    name = models.CharField(max_length=50, unique=True)
+    day = models.DateField()
+    used_today = models.IntegerField(default=0)
+    tokens = models.FloatField()
+    updated = models.FloatField()  # Unix time of the last refill
+
+    def __str__(self):
+        return f"{self.name} - Used today: {self.used_today} - Tokens: {self.tokens}"
@@ -0,0 +1,236 @@
+import math
+import threading
+from datetime import date
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThanOrEqual
+from time import monotonic, time
+from .models import UpstreamQuota
+
+
+INTERACTIVE = 0
+BACKGROUND = 1
+BACKFILL = 2
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    BACKGROUND: "background",
+    BACKFILL: "backfill",
+}
+
+
+def call_cost(days, locations=1):
+    """
+    Number of calls open-meteo counts for a request.
+
+    Open-meteo counts every location of a request as a call, and a request for more
+    than 14 days of data per location as one call per started 14 days.
+
+    Args:
+        days (int): Days of data per location.
+        locations (int): Locations in the request. Default is 1.
+
+    Returns:
+        int: Calls to spend from the quota.
+    """
+    return locations * max(1, math.ceil(days / 14))
+
+
+class QuotaExceeded(Exception):
+    """Raised when an upstream call cannot be made within the rate limit or the daily quota."""
+
+
+class QuotaManager:
+    """
+    Token bucket over upstream calls with priority classes.
+
+    The bucket and the daily call count live in an UpstreamQuota row, so server workers,
+    cron jobs and management commands all spend from the same budget. Each call is
+    spent with a single conditional UPDATE, which the database serializes.
+
+    Every class may only spend tokens (and daily quota) above its reserve, so lower
+    classes leave headroom for interactive forecasts. Within a process, while a higher
+    class is waiting, lower classes wait as well, and are served once the higher ones are done.
+
+    Args:
+        rate_per_minute (float): Sustained number of calls per minute.
+        burst (int): Bucket capacity, i.e. calls that can be made at once.
+        daily_quota (int): Calls allowed per day.
+        reserves (dict): Fraction of the bucket and daily quota a priority class may not touch.
+        name (str): Name of the shared UpstreamQuota row. Default is "open-meteo".
+    """
+
+    def __init__(self, rate_per_minute, burst, daily_quota, reserves, name="open-meteo"):
+        self.rate = rate_per_minute / 60
+        self.capacity = burst
+        self.daily_quota = daily_quota
+        self.reserves = reserves
+        self.name = name
+        self.condition = threading.Condition()
+        self.waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self.stats = {priority: {"calls": 0, "rejected": 0, "total_wait": 0.0, "max_wait": 0.0}
+                      for priority in PRIORITY_NAMES}
+
+    def state(self):
+        """The shared bucket row, created with a full bucket on first use."""
+        state, _ = UpstreamQuota.objects.get_or_create(name=self.name, defaults={
+            "day": date.today(),
+            "tokens": float(self.capacity),
+            "updated": time(),
+        })
+        return state
+
+    def available_tokens(self, now):
+        """Tokens in the shared bucket at time now, as a database expression."""
+        return Least(Value(float(self.capacity)), F("tokens") + (Value(now) - F("updated")) * Value(self.rate))
+
+    def daily_limit(self, priority):
+        return self.daily_quota * (1 - self.reserves.get(priority, 0))
+
+    def tokens_needed(self, priority, cost):
+        """Tokens that must be in the bucket before a call of the given priority can be made."""
+        reserve = self.capacity * self.reserves.get(priority, 0)
+        # Calls larger than the usable bucket go into debt, which later calls wait out
+        return reserve + min(cost, self.capacity - reserve)
+
+    def try_spend(self, priority, cost):
+        """
+        Spend the tokens and daily quota of a call if both are available.
+
+        Args:
+            priority (int): INTERACTIVE, BACKGROUND or BACKFILL.
+            cost (int): Number of upstream calls.
+
+        Returns:
+            float: 0 when the call was spent, otherwise the number of tokens still missing.
+
+        Raises:
+            QuotaExceeded: When the daily quota of the class is used up.
+        """
+        now = time()
+        today = date.today()
+        needed = self.tokens_needed(priority, cost)
+        rows = UpstreamQuota.objects.filter(name=self.name)
+        rows.exclude(day=today).update(day=today, used_today=0)
+
+        available = self.available_tokens(now)
+        spent = rows.filter(
+            GreaterThanOrEqual(available, needed),
+            used_today__lte=self.daily_limit(priority) - cost,
+        ).update(tokens=available - cost, updated=now, used_today=F("used_today") + cost)
+        if spent:
+            return 0
+
+        state = self.state()
+        if state.used_today + cost > self.daily_limit(priority):
+            raise QuotaExceeded(f"Daily upstream quota for {PRIORITY_NAMES[priority]} calls is used up.")
+        tokens = min(self.capacity, state.tokens + (now - state.updated) * self.rate)
+        # Another process may have spent the tokens in between, so always retry
+        return max(needed - tokens, 1e-3)
+
+    def acquire(self, priority=INTERACTIVE, cost=1, timeout=None):
+        """
+        Wait until a call may be made and spend its tokens.
+
+        Args:
+            priority (int): INTERACTIVE, BACKGROUND or BACKFILL.
+            cost (int): Number of upstream calls, e.g. locations in a multi-location request.
+            timeout (float): Seconds to wait at most. Default is None (wait as long as needed).
+
+        Raises:
+            QuotaExceeded: When the daily quota of the class is used up or the timeout expires.
+        """
+        started = monotonic()
+        with self.condition:
+            self.waiting[priority] += 1
+        # The lock only guards the in-process bookkeeping; spending talks to the database,
+        # which may be busy for longer than an interactive caller is willing to wait
+        try:
+            while True:
+                with self.condition:
+                    higher_waiting = any(self.waiting[other] for other in PRIORITY_NAMES if other < priority)
+                deficit = 0
+                if not higher_waiting:
+                    try:
+                        deficit = self.try_spend(priority, cost)
+                    except QuotaExceeded:
+                        self.reject(priority)
+                        raise
+                    if deficit <= 0:
+                        break
+
+                delay = deficit / self.rate if deficit > 0 else 0.05
+                if timeout is not None:
+                    remaining = timeout - (monotonic() - started)
+                    if remaining <= 0:
+                        self.reject(priority)
+                        raise QuotaExceeded(f"No upstream capacity for {PRIORITY_NAMES[priority]} calls in time.")
+                    delay = min(delay, remaining)
+                with self.condition:
+                    self.condition.wait(delay)
+
+            waited = monotonic() - started
+            with self.condition:
+                stats = self.stats[priority]
+                stats["calls"] += cost
+                stats["total_wait"] += waited
+                stats["max_wait"] = max(stats["max_wait"], waited)
+        finally:
+            with self.condition:
+                self.waiting[priority] -= 1
+                self.condition.notify_all()
+
+    def reject(self, priority):
+        with self.condition:
+            self.stats[priority]["rejected"] += 1
+
+    def metrics(self):
+        """
+        Remaining shared capacity, and queue depth and wait times per priority class.
+
+        Queue depths, call counts and waits are those of the current process.
+        """
+        state = self.state()
+        with self.condition:
+            return {
+                "tokens": min(self.capacity, state.tokens + (time() - state.updated) * self.rate),
+                "used_today": state.used_today if state.day == date.today() else 0,
+                "daily_quota": self.daily_quota,
+                "classes": {
+                    PRIORITY_NAMES[priority]: {
+                        "queue_depth": self.waiting[priority],
+                        "calls": stats["calls"],
+                        "rejected": stats["rejected"],
+                        "mean_wait": stats["total_wait"] / stats["calls"] if stats["calls"] else 0.0,
+                        "max_wait": stats["max_wait"],
+                    }
+                    for priority, stats in self.stats.items()
+                },
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """The quota manager for open-meteo, configured from the OPEN_METEO_* settings."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = QuotaManager(
+                rate_per_minute=settings.OPEN_METEO_RATE_PER_MINUTE,
+                burst=settings.OPEN_METEO_BURST,
+                daily_quota=settings.OPEN_METEO_DAILY_QUOTA,
+                reserves={
+                    INTERACTIVE: 0.0,
+                    BACKGROUND: settings.OPEN_METEO_BACKGROUND_RESERVE,
+                    BACKFILL: settings.OPEN_METEO_BACKFILL_RESERVE,
+                },
+            )
+        return _manager
+
+
+def acquire(priority=INTERACTIVE, cost=1, timeout=None):
+    """Acquire upstream capacity from the process-wide manager, see QuotaManager.acquire."""
+    get_manager().acquire(priority, cost, timeout)
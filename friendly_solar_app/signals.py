@@ -1,18 +1,22 @@
 import numpy as np
 import pandas as pd
-from . import utils
-from datetime import datetime, time
+from . import events, summaries, utils
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.signals import user_logged_in
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from sklearn.preprocessing import StandardScaler
+from django.utils import timezone
 from timezonefinder import TimezoneFinder
-from .models import UserProfile, WeeklyPlanner
+from .database import CoalescingWriter
+from .models import Appliance, DailySummary, UserProfile, WeeklyPlanner
 
 
 def create_user_profile(sender, instance, created, **kwargs):
-        """
+    """
     Create a user profile when a new account is created.
 
     Args:
@@ -26,7 +30,7 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 def save_user_profile(sender, instance, **kwargs):
-        """
+    """
     Save the user profile after each update.
 
     Args:
@@ -38,9 +42,12 @@ def save_user_profile(sender, instance, **kwargs):
 
 
 def generate_and_update_predictions(sender, request, user, **kwargs):
-       """
+    """
     Generate and update predictions based on user's location.
 
+    The upstream forecast is only fetched when the stored one is stale, and only
+    the hours that changed or are new are written.
+
     Args:
         sender: The sender of the signal.
         request: The request object.
@@ -52,33 +59,102 @@ def generate_and_update_predictions(sender, request, user, **kwargs):
     except UserProfile.DoesNotExist:
         return
 
+    if profile.latitude is None or profile.longitude is None or not forecast_is_stale(profile):
+        return
+
     try:
         latitude = profile.latitude
         longitude = profile.longitude
         days = 7
 
-        predictions_data = utils.predict_location(latitude, longitude, days)
-
-        for _, row in predictions_data.iterrows():
-            date_str = row["time"]
-            date = convert_to_date(date_str)
-            hour = convert_to_hour(date_str)
-            hourly_predictions = row["direct_radiation"]
-            azimuth = row["azimuth"]
-            elevation = row["elevation"]
-            try:
-                weekly_planner = WeeklyPlanner.objects.get(date=date, hour=hour, user=user)
-                weekly_planner.predictions = hourly_predictions
-                weekly_planner.azimuth = azimuth
-                weekly_planner.elevation = elevation
-                weekly_planner.save()
-            except WeeklyPlanner.DoesNotExist:
-                WeeklyPlanner.objects.create(user=user, date=date, hour=hour,
-                                             predictions=hourly_predictions, azimuth=azimuth, elevation=elevation)
+        predictions_data = utils.predict_location(latitude, longitude, days,
+                                                  timeout=settings.OPEN_METEO_INTERACTIVE_TIMEOUT)
+        if settings.FORECAST_WRITER_ENABLED:
+            changed = forecast_writer.submit((user, predictions_data), timeout=settings.FORECAST_WRITER_TIMEOUT)
+        else:
+            changed = write_predictions(user, predictions_data)
+        if changed and events.has_subscribers(user.id):
+            # Every row belongs to this user; cache the user and profile so that computing
+            # the produced energy does not query them once per row
+            user.userprofile = profile
+            for weekly_planner in changed:
+                weekly_planner.user = user
+            daily_summaries = DailySummary.objects.filter(user=user, date__in={weekly_planner.date for weekly_planner in changed})
+            events.publish(user.id, "planner", events.planner_delta(changed, daily_summaries))
+
+        profile.forecast_issued_at = timezone.now()
+        profile.save(update_fields=["forecast_issued_at"])
     except Exception as e:
         print("Error:", e)
 
 
+def forecast_is_stale(profile):
+    """Check whether the stored forecast of a user has to be refetched."""
+    if profile.forecast_issued_at is None:
+        return True
+    return timezone.now() - profile.forecast_issued_at >= timedelta(seconds=settings.FORECAST_MAX_AGE)
+
+
+def write_predictions(user, predictions_data):
+    """
+    Write a forecast frame to the weekly planner, touching only changed or new hours.
+
+    Args:
+        user: The user object.
+        predictions_data (pandas.DataFrame): Forecast with time, direct_radiation, azimuth and elevation columns.
+
+    Returns:
+        list: The WeeklyPlanner rows that were updated or created.
+    """
+    rows = {}
+    for date_str, hourly_predictions, azimuth, elevation in zip(
+            predictions_data["time"], predictions_data["direct_radiation"],
+            predictions_data["azimuth"], predictions_data["elevation"]):
+        key = (convert_to_date(date_str), convert_to_hour(date_str))
+        rows[key] = (to_float(hourly_predictions), to_float(azimuth), to_float(elevation))
+
+    existing = {
+        (weekly_planner.date, weekly_planner.hour): weekly_planner
+        for weekly_planner in WeeklyPlanner.objects.filter(user=user, date__in={date for date, _ in rows})
+    }
+
+    changed = []
+    created = []
+    for (date, hour), (hourly_predictions, azimuth, elevation) in rows.items():
+        weekly_planner = existing.get((date, hour))
+        if weekly_planner is None:
+            created.append(WeeklyPlanner(user=user, date=date, hour=hour,
+                                         predictions=hourly_predictions, azimuth=azimuth, elevation=elevation))
+        elif (weekly_planner.predictions, weekly_planner.azimuth, weekly_planner.elevation) != (hourly_predictions, azimuth, elevation):
+            weekly_planner.predictions = hourly_predictions
+            weekly_planner.azimuth = azimuth
+            weekly_planner.elevation = elevation
+            changed.append(weekly_planner)
+
+    if changed or created:
+        with transaction.atomic():
+            WeeklyPlanner.objects.bulk_update(changed, ["predictions", "azimuth", "elevation"])
+            WeeklyPlanner.objects.bulk_create(created)
+            summaries.refresh_daily_summaries(user, {weekly_planner.date for weekly_planner in changed + created})
+    return changed + created
+
+
+def write_predictions_batch(batch):
+    """Write the forecasts of many users in a single transaction."""
+    with transaction.atomic():
+        return [write_predictions(user, predictions_data) for user, predictions_data in batch]
+
+
+forecast_writer = CoalescingWriter(write_predictions_batch,
+                                   max_batch=settings.FORECAST_WRITER_MAX_BATCH,
+                                   max_delay=settings.FORECAST_WRITER_MAX_DELAY)
+
+
+def to_float(value):
+    """Convert a frame value to a float, mapping missing values to None."""
+    return None if pd.isna(value) else float(value)
+
+
 def update_weekly_planner(user, predictions):
     """Update the weekly planner for a given user."""
     power, _, elevation, azimuth = predictions
@@ -104,6 +180,20 @@ def update_weekly_planner(user, predictions):
             )
 
 
+def appliance_planner_days(appliance):
+    """(user id, date) pairs of the planner hours an appliance is assigned to."""
+    return set(appliance.weeklyplanner_set.filter(date__isnull=False).values_list("user_id", "date"))
+
+
+def refresh_planner_days(days):
+    """Recompute the daily summaries of (user id, date) pairs, once per user."""
+    dates_by_user = defaultdict(set)
+    for user_id, date in days:
+        dates_by_user[user_id].add(date)
+    for user_id, dates in dates_by_user.items():
+        summaries.refresh_daily_summaries(User(id=user_id), dates)
+
+
 def convert_to_date(date_str):
     """Convert a string to a date object."""
     return datetime.strptime(date_str, "%Y-%m-%dT%H:%M").date()
@@ -127,3 +217,39 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
 def generate_and_update_predictions_on_login(sender, request, user, **kwargs):
     """Signal triggered upon user login."""
     generate_and_update_predictions(sender, request, user, **kwargs)
+
+
+@receiver(m2m_changed, sender=WeeklyPlanner.appliances.through)
+def update_daily_summaries_on_appliance_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Signal to recompute the daily summaries of the days whose appliances changed."""
+    if action == "pre_clear" and reverse:
+        # pk_set is None when an appliance is cleared from every planner, so remember
+        # its days while the assignments still exist
+        instance._summary_days = appliance_planner_days(instance)
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        summaries.refresh_daily_summaries(instance.user, [instance.date])
+    elif action == "post_clear":
+        refresh_planner_days(getattr(instance, "_summary_days", ()))
+    elif pk_set:
+        refresh_planner_days(WeeklyPlanner.objects.filter(id__in=pk_set, date__isnull=False).values_list("user_id", "date"))
+
+
+@receiver(post_save, sender=Appliance)
+def update_daily_summaries_on_appliance_save(sender, instance, created, **kwargs):
+    """Signal to recompute the daily summaries of an edited appliance, whose consumption may have changed."""
+    if not created:
+        refresh_planner_days(appliance_planner_days(instance))
+
+
+@receiver(pre_delete, sender=Appliance)
+def remember_appliance_days(sender, instance, **kwargs):
+    """Signal to remember the days of an appliance, as its assignments are deleted along with it."""
+    instance._summary_days = appliance_planner_days(instance)
+
+
+@receiver(post_delete, sender=Appliance)
+def update_daily_summaries_on_appliance_delete(sender, instance, **kwargs):
+    """Signal to recompute the daily summaries of the days a deleted appliance was assigned to."""
+    refresh_planner_days(getattr(instance, "_summary_days", ()))
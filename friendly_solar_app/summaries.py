@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models import Sum
+from .models import DailySummary, WeeklyPlanner
+
+
+SUMMARY_FIELDS = ["total_produced", "total_consumed", "peak_hour", "surplus"]
+
+
+def refresh_daily_summaries(user, dates=None):
+    """
+    Recompute the per-day production summaries of a user.
+
+    Only the given dates are recomputed, so forecast refreshes and appliance
+    assignments touch just the days they changed.
+
+    Args:
+        user: The user object.
+        dates (iterable): Dates to recompute. Default is None (every planner date).
+
+    Returns:
+        list: The stored DailySummary rows.
+    """
+    weekly_planners = (WeeklyPlanner.objects.filter(user=user, date__isnull=False)
+                       .select_related("user__userprofile")
+                       .annotate(energy_consumed=Sum("appliances__energy_consumption")))
+    if dates is not None:
+        dates = set(dates)
+        weekly_planners = weekly_planners.filter(date__in=dates)
+
+    summaries = {}
+    peaks = {}
+    for weekly_planner in weekly_planners:
+        produced = weekly_planner.get_energy_produced() or 0.0
+        summary = summaries.setdefault(weekly_planner.date, DailySummary(user=user, date=weekly_planner.date))
+        summary.total_produced += produced
+        summary.total_consumed += weekly_planner.energy_consumed or 0.0
+        if produced > peaks.get(weekly_planner.date, 0.0):
+            peaks[weekly_planner.date] = produced
+            summary.peak_hour = weekly_planner.hour
+
+    for summary in summaries.values():
+        summary.surplus = summary.total_produced - summary.total_consumed
+
+    with transaction.atomic():
+        # Days that no longer have planner rows lose their summary
+        stale = DailySummary.objects.filter(user=user).exclude(date__in=summaries)
+        if dates is not None:
+            stale = stale.filter(date__in=dates)
+        stale.delete()
+        DailySummary.objects.bulk_create(summaries.values(), update_conflicts=True,
+                                         unique_fields=["user", "date"], update_fields=SUMMARY_FIELDS)
+    return list(summaries.values())
@@ -1,8 +1,23 @@
-from django.test import TestCase, Client
+import asyncio
+import numpy as np
+import os
+import tempfile
+import threading
+import pandas as pd
+from datetime import date, time
+from io import StringIO
+from unittest import mock
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import UserProfile, WeeklyPlanner, Appliance
-from .signals import generate_and_update_predictions, create_or_update_user_profile
+from .models import UserProfile, WeeklyPlanner, Appliance, DailySummary, HistoricalIrradiance, ClimatologyCell, UpstreamQuota
+from . import archive, climatology, events, exports, features, grid, lifetime, quota, utils
+from .database import CoalescingWriter
+from .signals import generate_and_update_predictions, create_or_update_user_profile, write_predictions
 
 
 class SignalTests(TestCase):
@@ -79,3 +94,581 @@ class ViewTests(TestCase):
         self.assertContains(response, "Invalid data")
 
 
+class GridTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        latitudes = np.array([50.0, 51.0, 52.0])
+        longitudes = np.array([19.0, 20.0])
+        lat_mesh, lon_mesh = np.meshgrid(latitudes, longitudes, indexing="ij")
+        # A plane is reproduced exactly by bilinear interpolation
+        irradiance = (100 + 10 * lat_mesh + 5 * lon_mesh)[:, :, None] * np.array([1.0, 2.0])
+        self.grid = {
+            "latitudes": latitudes,
+            "longitudes": longitudes,
+            "times": np.array(["2024-03-07T07:00", "2024-03-07T08:00"]),
+            "irradiance": irradiance,
+        }
+
+    def test_interpolate(self):
+        values = grid.interpolate(self.grid, [50.5, 51.75], [19.25, 20.0])
+        expected = (100 + 10 * np.array([50.5, 51.75]) + 5 * np.array([19.25, 20.0]))[:, None] * np.array([1.0, 2.0])
+        np.testing.assert_allclose(values, expected)
+
+    def test_covers(self):
+        self.assertTrue(grid.covers(self.grid, 51.0, 19.5))
+        self.assertFalse(grid.covers(self.grid, 53.0, 19.5))
+
+    @mock.patch("friendly_solar_app.views.utils.predict_location")
+    @mock.patch("friendly_solar_app.grid.utils.get_timezone_name", return_value="UTC")
+    def test_anonymous_calculate_uses_grid(self, get_timezone_name, predict_location):
+        with mock.patch("friendly_solar_app.grid.load_grid", return_value=self.grid):
+            response = self.client.post(reverse('calculate'), {'latitude': 51.0, 'longitude': 19.5})
+        self.assertEqual(response.status_code, 200)
+        predict_location.assert_not_called()
+
+    @mock.patch("friendly_solar_app.views.utils.predict_location")
+    def test_logged_in_calculate_fetches_exact_point(self, predict_location):
+        predict_location.return_value = pd.DataFrame({'time': ['2024-03-07T07:00'], 'direct_radiation': [120.0]})
+        User.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        with mock.patch("friendly_solar_app.grid.load_grid", return_value=self.grid):
+            response = self.client.post(reverse('calculate'), {'latitude': 51.0, 'longitude': 19.5})
+        self.assertEqual(response.status_code, 200)
+        predict_location.assert_called_once()
+        self.assertContains(response, '120.0')
+
+
+class BulkApplianceTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpassword')
+        self.other_user = User.objects.create_user(username='otheruser', email='other@example.com', password='otherpassword')
+        self.appliance = Appliance.objects.create(user=self.user, name='Dishwasher', energy_consumption=1200)
+        self.other_appliance = Appliance.objects.create(user=self.other_user, name='Dryer', energy_consumption=2000)
+        # 2024-03-04 is a Monday
+        self.planners = [
+            WeeklyPlanner.objects.create(user=self.user, date=date(2024, 3, day), hour=time(hour))
+            for day in range(4, 11) for hour in (18, 19, 20, 21)
+        ]
+        self.client.login(username='testuser', password='testpassword')
+        self.url = reverse('bulk_add_appliances_to_weekly_planner')
+
+    def test_recurring_assignment(self):
+        data = {'appliance': self.appliance.id, 'weekdays': [1, 2, 3, 4, 5], 'start_hour': '19:00', 'duration': 2}
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        assigned = WeeklyPlanner.objects.filter(appliances=self.appliance)
+        self.assertEqual(assigned.count(), 10)
+        self.assertEqual({planner.hour for planner in assigned}, {time(19), time(20)})
+
+    def test_pair_assignment(self):
+        data = {'assignment': [f'{planner.id}:{self.appliance.id}' for planner in self.planners[:3]]}
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(WeeklyPlanner.objects.filter(appliances=self.appliance).count(), 3)
+
+    def test_pair_assignment_rejects_foreign_appliance(self):
+        data = {'assignment': [f'{self.planners[0].id}:{self.other_appliance.id}']}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(WeeklyPlanner.objects.filter(appliances=self.other_appliance).exists())
+        # Ownership of the planner hours and appliances is checked in a single query
+        self.assertEqual(len([query for query in queries if Appliance._meta.db_table in query['sql']]), 1)
+
+    def test_pair_assignment_rejects_foreign_weekly_planner(self):
+        other_planner = WeeklyPlanner.objects.create(user=self.other_user, date=date(2024, 3, 4), hour=time(18))
+        data = {'assignment': [f'{other_planner.id}:{self.appliance.id}', f'{self.planners[0].id}:{self.appliance.id}']}
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(WeeklyPlanner.objects.filter(appliances=self.appliance).exists())
+
+
+@override_settings(FORECAST_WRITER_ENABLED=False)
+class ForecastRefreshTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpassword')
+        UserProfile.objects.filter(user=self.user).update(latitude=50.0, longitude=20.0)
+        self.predictions_data = pd.DataFrame([
+            {'time': '2024-03-07T07:00', 'direct_radiation': 100, 'azimuth': 180, 'elevation': 45},
+            {'time': '2024-03-07T08:00', 'direct_radiation': 120, 'azimuth': 200, 'elevation': 50},
+        ])
+
+    @mock.patch("friendly_solar_app.signals.utils.predict_location")
+    def test_repeated_login_skips_fresh_forecast(self, predict_location):
+        predict_location.return_value = self.predictions_data
+        generate_and_update_predictions(sender=None, request=None, user=self.user)
+        self.assertEqual(WeeklyPlanner.objects.filter(user=self.user).count(), 2)
+
+        # Only the profile lookup, no upstream call and no writes
+        with self.assertNumQueries(1):
+            generate_and_update_predictions(sender=None, request=None, user=self.user)
+        self.assertEqual(predict_location.call_count, 1)
+
+    @mock.patch("friendly_solar_app.signals.utils.predict_location")
+    def test_stale_forecast_writes_only_changed_hours(self, predict_location):
+        predict_location.return_value = self.predictions_data
+        generate_and_update_predictions(sender=None, request=None, user=self.user)
+        UserProfile.objects.filter(user=self.user).update(forecast_issued_at=None)
+
+        refreshed = self.predictions_data.copy()
+        refreshed.loc[1, 'direct_radiation'] = 130
+        predict_location.return_value = refreshed
+        generate_and_update_predictions(sender=None, request=None, user=self.user)
+
+        self.assertEqual(predict_location.call_count, 2)
+        self.assertEqual(WeeklyPlanner.objects.get(user=self.user, hour=time(8)).predictions, 130)
+        self.assertEqual(WeeklyPlanner.objects.filter(user=self.user).count(), 2)
+
+    @mock.patch("friendly_solar_app.signals.events.publish")
+    @mock.patch("friendly_solar_app.signals.utils.predict_location")
+    def test_planner_event_is_built_only_for_subscribers(self, predict_location, publish):
+        predict_location.return_value = pd.DataFrame([
+            {'time': f'2024-03-0{day}T{hour:02d}:00', 'direct_radiation': 100, 'azimuth': 180, 'elevation': 45}
+            for day in range(1, 8) for hour in range(24)
+        ])
+        generate_and_update_predictions(sender=None, request=None, user=self.user)
+        publish.assert_not_called()
+
+        UserProfile.objects.filter(user=self.user).update(forecast_issued_at=None)
+        predict_location.return_value = predict_location.return_value.assign(direct_radiation=120)
+        with mock.patch("friendly_solar_app.signals.events.has_subscribers", return_value=True):
+            with CaptureQueriesContext(connection) as queries:
+                generate_and_update_predictions(sender=None, request=None, user=self.user)
+        self.assertEqual(len(publish.call_args.args[2]['rows']), 168)
+        # No user or profile lookup per hour
+        self.assertLess(len(queries), 30)
+
+    def test_write_predictions_without_changes(self):
+        write_predictions(self.user, self.predictions_data)
+        with self.assertNumQueries(1):
+            self.assertEqual(write_predictions(self.user, self.predictions_data), [])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpassword')
+        # A fresh forecast keeps the login signal from fetching one
+        UserProfile.objects.filter(user=self.user).update(latitude=50.0, longitude=20.0, forecast_issued_at=timezone.now())
+        appliance = Appliance.objects.create(user=self.user, name='Kettle', energy_consumption=2000)
+        for hour in range(3):
+            weekly_planner = WeeklyPlanner.objects.create(user=self.user, date=date(2024, 3, 7), hour=time(hour), predictions=100)
+            weekly_planner.appliances.add(appliance)
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_export_weekly_planner_csv(self):
+        response = self.client.get(reverse('export_weekly_planner'))
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ",".join(exports.PLANNER_COLUMNS))
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].endswith(",2000.0"))
+
+    def test_export_rejects_unknown_format(self):
+        response = self.client.get(reverse('export_weekly_planner'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_rejects_invalid_dates(self):
+        for start in ['2024-13-01', 'yesterday']:
+            response = self.client.get(reverse('export_weekly_planner'), {'start': start})
+            self.assertEqual(response.status_code, 400)
+
+    def test_export_command_rejects_invalid_dates(self):
+        for start in ['2024-13-01', 'yesterday']:
+            with self.assertRaises(CommandError):
+                call_command('export_data', 'planner', '--start', start, stdout=StringIO())
+
+    def test_irradiance_export_requires_coordinates(self):
+        UserProfile.objects.filter(user=self.user).update(latitude=None, longitude=None)
+        response = self.client.get(reverse('export_irradiance'))
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch("friendly_solar_app.views.utils.fetch_archive")
+    def test_calculate_savings_does_not_store_archive(self, fetch_archive):
+        fetch_archive.return_value = pd.DataFrame({
+            'time': ['2022-06-01T11:00', '2022-06-01T12:00'],
+            'direct_normal_irradiance': [500.0, 700.0],
+            'direct_radiation': [400.0, 600.0],
+        })
+        self.client.get(reverse('calculate_savings'))
+        self.assertEqual(fetch_archive.call_count, 1)
+        self.assertFalse(HistoricalIrradiance.objects.exists())
+
+    @mock.patch("friendly_solar_app.views.utils.fetch_archive")
+    def test_calculate_savings_reuses_archived_cell(self, fetch_archive):
+        # Archived by a nearby location in the same cell
+        archive.store_archive(50.05, 20.05, pd.DataFrame({
+            'time': ['2022-06-01T11:00', '2022-06-01T12:00'],
+            'direct_normal_irradiance': [500.0, 700.0],
+            'direct_radiation': [400.0, 600.0],
+        }))
+        response = self.client.get(reverse('calculate_savings'))
+        self.assertEqual(response.status_code, 200)
+        fetch_archive.assert_not_called()
+        response = self.client.get(reverse('export_irradiance'))
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+
+class CoalescingWriterTests(SimpleTestCase):
+    def test_concurrent_submissions_are_coalesced(self):
+        batches = []
+        writer = CoalescingWriter(lambda batch: batches.append(batch) or [item * 2 for item in batch], max_delay=0.2)
+        results = {}
+        threads = [threading.Thread(target=lambda item=item: results.update({item: writer.submit(item)})) for item in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {item: item * 2 for item in range(10)})
+        self.assertLess(len(batches), 10)
+
+    def test_failing_item_does_not_fail_batch(self):
+        def write_batch(batch):
+            if 3 in batch:
+                raise ValueError("bad item")
+            return batch
+
+        writer = CoalescingWriter(write_batch)
+        self.assertEqual(writer.submit(1), 1)
+        with self.assertRaises(ValueError):
+            writer.submit(3)
+
+    def test_stuck_writer_does_not_block_submitter(self):
+        release = threading.Event()
+        writer = CoalescingWriter(lambda batch: release.wait(5) and batch)
+        try:
+            with self.assertRaises(TimeoutError):
+                writer.submit(1, timeout=0.05)
+        finally:
+            release.set()
+
+    @mock.patch("friendly_solar_app.database.close_old_connections")
+    def test_connection_is_recycled_between_batches(self, close_old_connections):
+        writer = CoalescingWriter(lambda batch: batch)
+        writer.submit(1)
+        self.assertEqual(close_old_connections.call_count, 2)
+
+
+class LifetimeTests(SimpleTestCase):
+    def test_vectorized_matches_single_locations(self):
+        latitudes = [52.0, 10.0, -33.9]
+        energy = lifetime.typical_year_energy(latitudes, 180, 35)
+        for latitude, expected in zip(latitudes, energy):
+            self.assertAlmostEqual(lifetime.typical_year_energy([latitude], 180, 35)[0], expected)
+
+    def test_chunks_match_single_pass(self):
+        latitudes = np.linspace(-60, 60, 7)
+        np.testing.assert_allclose(lifetime.typical_year_energy(latitudes, 180, 35, chunk_size=3),
+                                   lifetime.typical_year_energy(latitudes, 180, 35, chunk_size=10))
+
+    def test_panel_facing_equator_produces_more(self):
+        south, north = lifetime.typical_year_energy([52.0, 52.0], [180, 0], 35)
+        self.assertGreater(south, north)
+
+    def test_degradation_and_leap_years(self):
+        years = list(lifetime.simulate_lifetime([52.0], 180, 35, 10, 0.2, years=5, start_year=2023))
+        self.assertEqual([year['year'] for year in years], [2023, 2024, 2025, 2026, 2027])
+        self.assertAlmostEqual(years[1]['energy'][0], years[0]['energy'][0] * (1 - lifetime.DEGRADATION) * 366 / 365)
+        self.assertGreater(years[0]['energy'][0], years[2]['energy'][0])
+        self.assertAlmostEqual(years[-1]['cumulative_savings'][0], sum(year['savings'][0] for year in years))
+
+
+class LifetimeViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        # A fresh forecast keeps the login signal from fetching one
+        UserProfile.objects.filter(user=self.user).update(
+            latitude=50.06, longitude=19.94, azimuth=180.0, elevation=35.0, panel_surface=10.0,
+            panel_efficiency=None, forecast_issued_at=timezone.now())
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_missing_efficiency_uses_default(self):
+        response = self.client.get(reverse('lifetime_simulation'), {'years': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'nan')
+        expected = lifetime.simulate_lifetime([50.06], 180.0, 35.0, 10.0, 0.2, years=2)
+        self.assertEqual([row['energy'] for row in response.context['rows']],
+                         [year['energy'][0] for year in expected])
+
+    def test_command_uses_default_efficiency(self):
+        output = StringIO()
+        call_command('simulate_lifetime', '--years', '1', stdout=output)
+        self.assertNotIn('nan', output.getvalue())
+
+
+class ClimatologyTests(TestCase):
+    def setUp(self):
+        times = pd.date_range('2010-01-01', '2012-12-31 23:00', freq='h')
+        # Irradiance grows with the year, so the quantiles of every hour are known
+        self.data = pd.DataFrame({
+            'time': times.strftime('%Y-%m-%dT%H:%M'),
+            'direct_normal_irradiance': (times.year - 2009) * 100.0,
+            'direct_radiation': (times.year - 2009) * 10.0,
+        })
+
+    def test_compute_quantiles(self):
+        quantiles = climatology.compute_quantiles(self.data)
+        self.assertEqual(quantiles.shape, climatology.SHAPE)
+        self.assertEqual(quantiles.dtype, np.float32)
+        np.testing.assert_allclose(quantiles[100, 12], [10.0, 20.0, 30.0])
+
+    def test_yearly_quantiles_use_complete_years(self):
+        partial = self.data[self.data['time'] < '2012-06-01']
+        p10, p50, p90 = climatology.compute_yearly_quantiles(partial)
+        self.assertAlmostEqual(p50, 8760 * 150.0)
+
+    def test_band_lookup(self):
+        latitude, longitude = climatology.snap(50.06, 19.94)
+        climatology.store_cell(latitude, longitude, self.data)
+        bands = climatology.get_bands(climatology.get_cell(50.06, 19.94))
+        # Planner bands are of the forecast variable, not of direct normal irradiance
+        self.assertEqual(climatology.band_at(bands, date(2024, 4, 9), time(12)), (10.0, 20.0, 30.0))
+        self.assertIsNone(climatology.get_cell(10.0, 10.0))
+
+    @mock.patch("friendly_solar_app.management.commands.compute_climatology.utils.fetch_archive")
+    def test_command_backfills_only_missing_cells(self, fetch_archive):
+        fetch_archive.return_value = self.data
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        UserProfile.objects.filter(user=user).update(latitude=50.06, longitude=19.94)
+        call_command('compute_climatology', stdout=StringIO())
+        call_command('compute_climatology', stdout=StringIO())
+        self.assertEqual(fetch_archive.call_count, 1)
+        self.assertEqual(HistoricalIrradiance.objects.count(), len(self.data))
+        bands = climatology.get_bands(ClimatologyCell.objects.get())
+        self.assertEqual(climatology.band_at(bands, date(2024, 4, 9), time(12)), (10.0, 20.0, 30.0))
+
+    @mock.patch("friendly_solar_app.management.commands.compute_climatology.utils.fetch_archive")
+    def test_command_refetches_cells_without_direct_radiation(self, fetch_archive):
+        fetch_archive.return_value = self.data
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        UserProfile.objects.filter(user=user).update(latitude=50.06, longitude=19.94)
+        # Archived before direct radiation was stored
+        archive.store_archive(50.06, 19.94, self.data.assign(direct_radiation=np.nan))
+        call_command('compute_climatology', stdout=StringIO())
+        self.assertEqual(fetch_archive.call_count, 1)
+
+
+class EventTests(SimpleTestCase):
+    async def test_publish_from_other_thread_reaches_subscriber(self):
+        stream = events.stream(1)
+        self.assertEqual(await anext(stream), "retry: 1000\n: connected\n\n")
+        await asyncio.get_running_loop().run_in_executor(None, events.publish, 1, "savings", {"savings": 1.5})
+        message = await asyncio.wait_for(anext(stream), 1)
+        self.assertEqual(message, 'event: savings\ndata: {"savings":1.5}\n\n')
+        await stream.aclose()
+        self.assertNotIn(1, events._subscribers)
+
+    async def test_stream_ends_after_max_lifetime(self):
+        messages = [message async for message in events.stream(3, max_lifetime=0.05)]
+        self.assertEqual(len(messages), 1)
+        self.assertNotIn(3, events._subscribers)
+
+    def test_publish_without_subscribers(self):
+        events.publish(2, "planner", {"rows": []})
+
+
+class EventViewTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_wsgi_does_not_stream_events(self):
+        response = self.client.get(reverse('planner_events'))
+        self.assertEqual(response.status_code, 204)
+        self.assertNotContains(self.client.get(reverse('view_weekly_planner')), 'EventSource')
+
+
+class QuotaTests(TestCase):
+    def setUp(self):
+        self.manager = quota.QuotaManager(rate_per_minute=60, burst=10, daily_quota=100,
+                                          reserves={quota.INTERACTIVE: 0.0, quota.BACKGROUND: 0.2, quota.BACKFILL: 0.5})
+
+    def test_backfill_leaves_reserve_for_interactive(self):
+        for _ in range(5):
+            self.manager.acquire(quota.BACKFILL)
+        with self.assertRaises(quota.QuotaExceeded):
+            self.manager.acquire(quota.BACKFILL, timeout=0.1)
+        for _ in range(5):
+            self.manager.acquire(quota.INTERACTIVE, timeout=0)
+
+    def test_daily_quota(self):
+        self.manager.acquire(quota.INTERACTIVE, cost=60)
+        with self.assertRaises(quota.QuotaExceeded):
+            self.manager.acquire(quota.BACKFILL)
+
+    def test_quota_is_shared_between_processes(self):
+        # A second manager stands in for another worker or a management command
+        other = quota.QuotaManager(rate_per_minute=60, burst=10, daily_quota=100, reserves=self.manager.reserves)
+        self.manager.acquire(quota.INTERACTIVE, cost=60)
+        with self.assertRaises(quota.QuotaExceeded):
+            other.acquire(quota.BACKFILL)
+        self.assertEqual(other.metrics()['used_today'], 60)
+
+    def test_daily_count_resets(self):
+        self.manager.acquire(quota.INTERACTIVE)
+        UpstreamQuota.objects.update(day=date(2024, 3, 7), used_today=100)
+        self.manager.acquire(quota.BACKFILL, timeout=0)
+        self.assertEqual(UpstreamQuota.objects.get().used_today, 1)
+
+    def test_slow_spend_does_not_block_other_callers(self):
+        spending = threading.Event()
+        release = threading.Event()
+        try_spend = self.manager.try_spend
+
+        def slow_try_spend(priority, cost):
+            # Stands in for a spend waiting on a busy database
+            if priority == quota.BACKFILL:
+                spending.set()
+                release.wait(5)
+                return 0
+            return try_spend(priority, cost)
+
+        with mock.patch.object(self.manager, "try_spend", side_effect=slow_try_spend):
+            backfill = threading.Thread(target=self.manager.acquire, args=(quota.BACKFILL,))
+            backfill.start()
+            self.assertTrue(spending.wait(1))
+            try:
+                self.manager.acquire(quota.INTERACTIVE, timeout=0.5)
+            finally:
+                release.set()
+                backfill.join()
+
+    @mock.patch("friendly_solar_app.utils.requests.get")
+    @mock.patch("friendly_solar_app.utils.quota.acquire")
+    def test_archive_is_charged_per_fourteen_days(self, acquire, get):
+        get.return_value.json.return_value = {"hourly": {"time": [], "direct_normal_irradiance": [], "direct_radiation": []}}
+        utils.fetch_archive(50.0, 20.0, 2011, 2023)
+        # 4,748 days are 340 started periods of 14 days
+        self.assertEqual(acquire.call_args.kwargs["cost"], 340)
+        self.assertEqual(quota.call_cost(7, locations=50), 50)
+
+    def test_metrics(self):
+        self.manager.acquire(quota.BACKGROUND, cost=3)
+        metrics = self.manager.metrics()
+        self.assertEqual(metrics['used_today'], 3)
+        self.assertEqual(metrics['classes']['background']['calls'], 3)
+        self.assertEqual(metrics['classes']['interactive']['queue_depth'], 0)
+
+
+class DailySummaryTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpassword')
+        # A fresh forecast keeps the login signal from fetching one
+        UserProfile.objects.filter(user=self.user).update(latitude=50.0, longitude=20.0, panel_surface=10.0, azimuth=180.0,
+                                                          elevation=35.0, forecast_issued_at=timezone.now())
+        self.user.refresh_from_db()
+        self.appliance = Appliance.objects.create(user=self.user, name='Washer', energy_consumption=500)
+        self.predictions_data = pd.DataFrame([
+            {'time': f'2024-03-0{day}T{hour:02d}:00', 'direct_radiation': 10.0 * hour, 'azimuth': 180, 'elevation': 30}
+            for day in (7, 8) for hour in range(24)
+        ])
+        write_predictions(self.user, self.predictions_data)
+
+    def test_forecast_write_creates_summaries(self):
+        summaries = DailySummary.objects.filter(user=self.user).order_by('date')
+        self.assertEqual([summary.date for summary in summaries], [date(2024, 3, 7), date(2024, 3, 8)])
+        summary = summaries[0]
+        expected = sum(planner.get_energy_produced() for planner in WeeklyPlanner.objects.filter(user=self.user, date=date(2024, 3, 7)))
+        self.assertAlmostEqual(summary.total_produced, expected)
+        self.assertEqual(summary.peak_hour, time(23))
+        self.assertAlmostEqual(summary.surplus, expected)
+
+    def test_appliance_assignment_updates_summary(self):
+        weekly_planner = WeeklyPlanner.objects.get(user=self.user, date=date(2024, 3, 8), hour=time(12))
+        weekly_planner.appliances.add(self.appliance)
+        self.assertEqual(DailySummary.objects.get(user=self.user, date=date(2024, 3, 8)).total_consumed, 500)
+        self.assertEqual(DailySummary.objects.get(user=self.user, date=date(2024, 3, 7)).total_consumed, 0)
+
+    def assign_appliance(self):
+        weekly_planner = WeeklyPlanner.objects.get(user=self.user, date=date(2024, 3, 8), hour=time(12))
+        weekly_planner.appliances.add(self.appliance)
+
+    def consumed(self):
+        return DailySummary.objects.get(user=self.user, date=date(2024, 3, 8)).total_consumed
+
+    def test_reverse_clear_updates_summary(self):
+        self.assign_appliance()
+        self.appliance.weeklyplanner_set.clear()
+        self.assertEqual(self.consumed(), 0)
+
+    def test_appliance_edit_updates_summary(self):
+        self.assign_appliance()
+        self.appliance.energy_consumption = 200
+        self.appliance.save()
+        self.assertEqual(self.consumed(), 200)
+
+    def test_appliance_delete_updates_summary(self):
+        self.assign_appliance()
+        self.appliance.delete()
+        self.assertEqual(self.consumed(), 0)
+
+    def test_bulk_assignment_updates_summary(self):
+        self.client.login(username='testuser', password='testpassword')
+        data = {'appliance': self.appliance.id, 'weekdays': [4], 'start_hour': '19:00', 'duration': 2}
+        self.client.post(reverse('bulk_add_appliances_to_weekly_planner'), data)
+        self.assertEqual(DailySummary.objects.get(user=self.user, date=date(2024, 3, 7)).total_consumed, 1000)
+
+    def test_planner_page_query_count_does_not_grow_with_rows(self):
+        self.client.login(username='testuser', password='testpassword')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('view_weekly_planner'))
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(queries), 15)
+
+
+class FeatureTests(SimpleTestCase):
+    def setUp(self):
+        times = pd.date_range('2024-06-21', periods=24, freq='h')
+        frame = pd.DataFrame({'time': times.strftime('%Y-%m-%dT%H:%M'), 'direct_radiation': np.arange(24.0)})
+        self.frame = features.add_solar_geometry(frame, 52.2, 21.0, 2)
+
+    def test_solar_geometry(self):
+        self.assertEqual(self.frame['elevation'].idxmax(), 13)
+        self.assertLess(self.frame.loc[0, 'elevation'], 0)
+        self.assertTrue(np.isinf(self.frame.loc[0, 'air_mass']))
+        self.assertLess(self.frame.loc[9, 'azimuth'], 180)
+        self.assertGreater(self.frame.loc[17, 'azimuth'], 180)
+
+    def test_persisted_pipeline_is_reused(self):
+        pipeline = features.FeaturePipeline().partial_fit(self.frame)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pipeline.joblib')
+            pipeline.save(path)
+            loaded = features.get_pipeline(path)
+            self.assertIs(features.get_pipeline(path), loaded)
+            inputs = loaded.transform(self.frame)
+        self.assertEqual(inputs.shape, (24, len(features.FEATURE_COLUMNS)))
+        self.assertTrue(np.isfinite(inputs).all())
+        np.testing.assert_allclose(inputs, pipeline.transform(self.frame))
+
+
+class IndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+
+    def assertSearchesIndex(self, queryset, columns):
+        # SQLite inlines unique constraints into the table, so their indexes are named sqlite_autoindex_*
+        plan = queryset.explain()
+        self.assertIn(f'SEARCH {queryset.model._meta.db_table} USING INDEX', plan)
+        self.assertIn(f'({columns})', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_weekly_planner_lookups(self):
+        self.assertSearchesIndex(WeeklyPlanner.objects.filter(user=self.user).order_by('date', 'hour'), 'user_id=?')
+        self.assertSearchesIndex(WeeklyPlanner.objects.filter(user=self.user, date__in=[date(2024, 3, 7)]),
+                                 'user_id=? AND date=?')
+        self.assertSearchesIndex(WeeklyPlanner.objects.filter(user=self.user, date=date(2024, 3, 7), hour=time(12)),
+                                 'user_id=? AND date=? AND hour=?')
+
+    def test_appliance_lookups(self):
+        for queryset in [Appliance.objects.filter(user=self.user), Appliance.objects.filter(user=self.user, is_public=True)]:
+            self.assertIn('appliance_user_public_idx', queryset.explain())
+            self.assertSearchesIndex(queryset, 'user_id=?')
+
+    def test_summary_and_archive_lookups(self):
+        self.assertSearchesIndex(DailySummary.objects.filter(user=self.user).order_by('date'), 'user_id=?')
+        self.assertSearchesIndex(HistoricalIrradiance.objects.filter(latitude=52.0, longitude=21.0),
+                                 'latitude=? AND longitude=?')
@@ -5,7 +5,13 @@ import pandas as pd
 import pytz
 import requests
 import scipy.stats as stats
-from datetime import datetime, time
+from datetime import date, datetime, time
+from timezonefinder import TimezoneFinder
+from . import features, quota
+
+
+# Hourly open-meteo variable of every forecast, whether fetched per location or for the grid
+FORECAST_VARIABLE = "direct_radiation"
 
 
 def predict_location(latitude, longitude, days=7):
@@ -30,7 +36,7 @@ def predict_location(latitude, longitude, days=7):
 
 
 def get_timezone_name(latitude, longitude):
-        """
+    """
     Retrieve the timezone name for a given location.
 
     Args:
@@ -100,7 +106,7 @@ def generate_many_years(time_zone, longitude, latitude, years, counter, days=0):
 
 
 def generate_solar_data(day_of_year, time_zone, longitude, latitude):
-        """
+    """
     Generate solar data for a single day.
 
     Args:
@@ -173,15 +179,97 @@ def calculate_solar_parameters(declination_angle, latitude, local_solar_time):
     return elevation_angle, azimuth, air_mass
 
 
-def predict_location(latitude, longitude, days):
+def calculate_irradiance_array(day_of_year):
+    """Vectorized calculate_irradiance for an array of days of the year."""
+    return (1 + 0.033 * np.cos(2 * np.pi * (day_of_year - 4) / 365)) * 1.366
+
+
+def calculate_solar_geometry(day_of_year, local_solar_time, latitude):
+    """
+    Vectorized solar position for arrays of days, solar times and latitudes.
+
+    The arguments are broadcast against each other, so e.g. days of shape (1, 365, 1),
+    hours of shape (1, 1, 24) and latitudes of shape (n, 1, 1) give (n, 365, 24) arrays.
+
+    Args:
+        day_of_year (numpy.ndarray): Day of the year.
+        local_solar_time (numpy.ndarray): Local solar time in hours.
+        latitude (numpy.ndarray): Latitude in degrees.
+
+    Returns:
+        tuple: Elevation angle, azimuth (degrees clockwise from north) and air mass.
+        Air mass is infinite while the sun is below the horizon.
+    """
+    declination = np.radians(23.45 * np.sin(np.radians(360 / 365 * (day_of_year + 284))))
+    hour_angle = np.radians(15 * (local_solar_time - 12))
+    latitude = np.radians(latitude)
+
+    sin_elevation = (np.sin(declination) * np.sin(latitude)
+                     + np.cos(declination) * np.cos(latitude) * np.cos(hour_angle))
+    elevation = np.degrees(np.arcsin(np.clip(sin_elevation, -1, 1)))
+
+    cos_azimuth = ((np.sin(declination) * np.cos(latitude)
+                    - np.cos(declination) * np.sin(latitude) * np.cos(hour_angle))
+                   / np.maximum(np.cos(np.radians(elevation)), 1e-9))
+    azimuth = np.degrees(np.arccos(np.clip(cos_azimuth, -1, 1)))
+    # The sun is west of the meridian in the afternoon
+    azimuth = np.where(hour_angle > 0, 360 - azimuth, azimuth)
+
+    zenith = 90 - np.maximum(elevation, 0.01)
+    air_mass = 1 / (np.cos(np.radians(zenith)) + 0.50572 * (96.07995 - zenith) ** -1.6364)
+    air_mass = np.where(elevation > 0, air_mass, np.inf)
+    return elevation, azimuth, air_mass
+
+
+def calculate_local_solar_time_array(local_time, time_zone, longitude, day_of_year):
+    """Vectorized local solar time for arrays of clock hours and days of the year."""
+    return local_time + (4 * (longitude - 15 * time_zone) + calculate_equation_of_time_array(day_of_year)) / 60
+
+
+def calculate_equation_of_time_array(day_of_year):
+    """Vectorized equation of time in minutes."""
+    B = np.radians(360 / 365 * (day_of_year - 81))
+    return 9.87 * np.sin(2 * B) - 7.53 * np.cos(B) - 1.5 * np.sin(B)
+
+
+def predict_location(latitude, longitude, days, priority=quota.INTERACTIVE, timeout=None):
     """Predict solar data for a location over a specified number of days."""
+    quota.acquire(priority, cost=quota.call_cost(days), timeout=timeout)
     response = requests.get("https://api.open-meteo.com/v1/forecast?latitude=" + str(latitude) + "&longitude=" + 
-str(longitude) + "&hourly=direct_radiation&forecast_days=" + 
+str(longitude) + "&hourly=" + FORECAST_VARIABLE + "&forecast_days=" + 
 str(days) + "&timezone=auto")
 
     response_json = response.json()
     data = pd.DataFrame(response_json['hourly'])
+    data = features.add_solar_geometry(data, latitude, longitude, response_json['utc_offset_seconds'] / 3600)
     
     """for the purposes of the demonstration, the exact implementation of the data processing and the use of an ensemble of hybrid neural network models for irradiance prediction have been hidden"""
+    # The model would take features.model_inputs(data), scaled by the pipeline fitted with fit_feature_scaler
 
     return data
+
+
+def fetch_archive(latitude, longitude, year_start, year_end, priority=quota.BACKFILL, timeout=None):
+    """
+    Fetch historical hourly direct normal irradiance and direct radiation for a location.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longitude (float): Longitude of the location.
+        year_start (int): First year of the archive.
+        year_end (int): Last year of the archive (inclusive).
+        priority (int): Upstream quota priority class. Default is quota.BACKFILL.
+        timeout (float): Seconds to wait for upstream capacity. Default is None (no limit).
+
+    Returns:
+        pandas.DataFrame: Hourly irradiance with time, direct_normal_irradiance and FORECAST_VARIABLE columns.
+
+    Raises:
+        quota.QuotaExceeded: When no upstream capacity is available in time.
+    """
+    days = (date(year_end, 12, 31) - date(year_start, 1, 1)).days + 1
+    quota.acquire(priority, cost=quota.call_cost(days), timeout=timeout)
+    api_request = f"https://archive-api.open-meteo.com/v1/archive?latitude={latitude}&longitude={longitude}&start_date={year_start}-01-01&end_date={year_end}-12-31&hourly=direct_normal_irradiance,{FORECAST_VARIABLE}&models=best_match&timezone=auto"
+    response = requests.get(api_request)
+    response_json = response.json()
+    return pd.DataFrame(response_json['hourly'])
@@ -1,14 +1,14 @@
 from django.contrib.auth import logout
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render, get_object_or_404
-from django.http import HttpResponse
-from myapp.models import UserProfile
-from .models import WeeklyPlanner, Appliance
-from .forms import ApplianceForm, UserProfileForm
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from .models import UserProfile, WeeklyPlanner, Appliance, DailySummary
+from .forms import ApplianceForm, RecurringApplianceForm, UserProfileForm
 import json
-from . import utils
-import pandas as pd
-import requests
+from . import archive, climatology, events, exports, grid, lifetime, quota, summaries, utils
 
 def calculate(request):
     if request.method == 'POST':
@@ -27,8 +27,17 @@ def calculate(request):
             return HttpResponse("Latitude and/or longitude are required.", status=400)
             
         days = 7
-        predictions = utils.predict_location(latitude, longitude, days)
-        result = list(zip(predictions["time"].tolist(), predictions["direct_normal_irradiance"].tolist()))
+        predictions = None
+        # Anonymous visitors are served from the precomputed grid, logged-in users get exact points
+        if not request.user.is_authenticated:
+            predictions = grid.predict_from_grid(latitude, longitude)
+        if predictions is None:
+            try:
+                predictions = utils.predict_location(latitude, longitude, days, timeout=settings.OPEN_METEO_INTERACTIVE_TIMEOUT)
+            except quota.QuotaExceeded as e:
+                print("QuotaExceeded:", e)
+                return HttpResponse("Too many requests, please try again later.", status=503)
+        result = list(zip(predictions["time"].tolist(), predictions[utils.FORECAST_VARIABLE].tolist()))
 
         return display_result(request, result)
     
@@ -77,9 +86,19 @@ def custom_logout(request):
 @login_required
 def view_weekly_planner(request):
     user = request.user
-    predictions = WeeklyPlanner.objects.filter(user=user)
+    predictions = list(WeeklyPlanner.objects.filter(user=user).order_by('date', 'hour')
+                       .select_related('user__userprofile').prefetch_related('appliances'))
+    # Historical irradiance range of each hour, looked up in the precomputed climatology
+    profile = UserProfile.objects.filter(user=user).first()
+    bands = climatology.get_bands(climatology.get_cell(profile.latitude, profile.longitude)) if profile else None
+    for prediction in predictions:
+        prediction.band = None
+        if bands is not None and prediction.date is not None and prediction.hour is not None:
+            prediction.band = climatology.band_at(bands, prediction.date, prediction.hour)
     appliances = Appliance.objects.filter(user=user) 
-    return render(request, 'view_weekly_planner.html', {'predictions': predictions, 'appliances': appliances} )
+    recurring_form = RecurringApplianceForm(user)
+    daily_summaries = DailySummary.objects.filter(user=user).order_by('date')
+    return render(request, 'view_weekly_planner.html', {'predictions': predictions, 'appliances': appliances, 'recurring_form': recurring_form, 'daily_summaries': daily_summaries, 'live_updates': events.supports_streaming(request)} )
 
 def create_appliance(request):
     if request.method == 'POST':
@@ -111,6 +130,60 @@ def add_appliance_to_weekly_planner(request):
     
     return redirect('view_weekly_planner')
 
+def bulk_assign_appliances(user, pairs):
+    """Attach appliances to weekly planner hours with a single insert into the through table."""
+    through = WeeklyPlanner.appliances.through
+    rows = [through(weeklyplanner_id=weekly_planner_id, appliance_id=appliance_id)
+            for weekly_planner_id, appliance_id in pairs]
+    through.objects.bulk_create(rows, ignore_conflicts=True)
+    # bulk_create does not send m2m_changed, so the affected days are refreshed here
+    dates = WeeklyPlanner.objects.filter(id__in={weekly_planner_id for weekly_planner_id, _ in pairs}).values_list('date', flat=True).distinct()
+    summaries.refresh_daily_summaries(user, dates)
+    return len(rows)
+
+@login_required
+def bulk_add_appliances_to_weekly_planner(request):
+    """
+    Assign appliances to many weekly planner hours at once.
+
+    Accepts either a list of "weekly_planner_id:appliance_id" values in the `assignment` field,
+    or a recurrence rule (appliance, weekdays, start_hour, duration), e.g. weekdays 19:00 for 2 h.
+    """
+    if request.method != 'POST':
+        return redirect('view_weekly_planner')
+
+    assignments = request.POST.getlist('assignment')
+    if assignments:
+        try:
+            pairs = {tuple(int(value) for value in assignment.split(':')) for assignment in assignments}
+            weekly_planner_ids = {weekly_planner_id for weekly_planner_id, _ in pairs}
+            appliance_ids = {appliance_id for _, appliance_id in pairs}
+        except ValueError as e:
+            print("ValueError:", e)
+            return HttpResponse("Assignments are invalid.", status=400)
+
+        # Count the owned planner hours and appliances in one query
+        owned = (WeeklyPlanner.objects.filter(user=request.user, id__in=weekly_planner_ids).values_list('id')
+                 .union(Appliance.objects.filter(user=request.user, id__in=appliance_ids).values_list('id'), all=True)
+                 .count())
+        if owned != len(weekly_planner_ids) + len(appliance_ids):
+            return HttpResponse("Weekly planner or appliance not found.", status=404)
+    else:
+        form = RecurringApplianceForm(request.user, request.POST)
+        if not form.is_valid():
+            return HttpResponse("Form data is invalid.", status=400)
+
+        appliance = form.cleaned_data['appliance']
+        weekly_planner_ids = WeeklyPlanner.objects.filter(
+            user=request.user,
+            date__iso_week_day__in=form.cleaned_data['weekdays'],
+            hour__in=form.get_hours(),
+        ).values_list('id', flat=True)
+        pairs = [(weekly_planner_id, appliance.id) for weekly_planner_id in weekly_planner_ids]
+
+    bulk_assign_appliances(request.user, pairs)
+    return redirect('view_weekly_planner')
+
 @login_required
 def add_panel_surface(request):
     if request.method == 'POST':
@@ -132,6 +205,8 @@ def add_panel_surface(request):
             user_profile.azimuth = azimuth
             user_profile.elevation = elevation
             user_profile.save()
+            # Production depends on the panel, so every day has to be recomputed
+            summaries.refresh_daily_summaries(request.user)
             return redirect('user_profile')
         else:
             return HttpResponse("Panel surface, azimuth, and elevation are required.", status=400)
@@ -156,16 +231,16 @@ def calculate_savings(request):
 
     years = year_end - year_start + 1
 
-    api_request = f"https://archive-api.open-meteo.com/v1/archive?latitude={latitude}&longitude={longitude}&start_date={year_start}-01-01&end_date={year_end}-12-31&hourly=direct_normal_irradiance&models=best_match&timezone=auto"
-
     try:
-        response = requests.get(api_request)
-        response_json = response.json()
-        data = pd.DataFrame(response_json['hourly'])
+        irradiance_mean = archive.archived_mean(latitude, longitude)
+        if irradiance_mean is None:
+            # Until `python manage.py compute_climatology` archives the cell, fetch without storing,
+            # so the request does not hold the database write lock for the whole archive
+            data = utils.fetch_archive(latitude, longitude, year_start, year_end, timeout=settings.OPEN_METEO_INTERACTIVE_TIMEOUT)
 
-        target = "direct_normal_irradiance"
+            target = "direct_normal_irradiance"
 
-        irradiance_mean = data[target].mean()
+            irradiance_mean = data[target].mean()
 
         expected_irradiance_yearly = irradiance_mean * 365 * 24
 
@@ -182,11 +257,120 @@ def calculate_savings(request):
             'irradiance': expected_irradiance_yearly_kW,
             'savings': savings,
             'azimuth': azimuth,
-            'elevation': elevation
+            'elevation': elevation,
+            'live_updates': events.supports_streaming(request),
         }
+
+        cell = climatology.get_cell(latitude, longitude)
+        if cell is not None and cell.yearly_p10 is not None:
+            yearly_bands = [cell.yearly_p10, cell.yearly_p50, cell.yearly_p90]
+            context['irradiance_bands'] = [value * 1.315 * 0.001 for value in yearly_bands]
+            context['savings_bands'] = [value * 1.315 * energy_price * panel_efficiency for value in yearly_bands]
+
+        events.publish(request.user.id, 'savings', {'irradiance': expected_irradiance_yearly_kW, 'savings': savings})
     
         return render(request, 'calculate_savings.html', context)
     
+    except quota.QuotaExceeded as e:
+        print("QuotaExceeded:", e)
+        return HttpResponse("Too many requests, please try again later.", status=503)
+
     except Exception as e:
         print("Error calculating savings:", e)
         return HttpResponse("Error calculating savings.", status=500)
+
+@login_required
+def lifetime_simulation(request):
+    user_profile = get_object_or_404(UserProfile, user=request.user)
+    if None in (user_profile.latitude, user_profile.azimuth, user_profile.elevation) or not user_profile.panel_surface:
+        return HttpResponse("Coordinates, panel surface and angles are required.", status=400)
+
+    try:
+        years = int(request.GET.get('years', lifetime.YEARS))
+    except ValueError as e:
+        print("ValueError:", e)
+        return HttpResponse("Number of years is invalid.", status=400)
+    if not 1 <= years <= 50:
+        return HttpResponse("Number of years must be between 1 and 50.", status=400)
+
+    simulation = lifetime.simulate_lifetime([user_profile.latitude], user_profile.azimuth, user_profile.elevation,
+                                            user_profile.panel_surface, lifetime.profile_efficiency(user_profile), years=years)
+    rows = [
+        {
+            'year': year['year'],
+            'energy': year['energy'][0],
+            'savings': year['savings'][0],
+            'cumulative_savings': year['cumulative_savings'][0],
+        }
+        for year in simulation
+    ]
+    context = {
+        'rows': rows,
+        'degradation': lifetime.DEGRADATION * 100,
+        'tariff_escalation': lifetime.TARIFF_ESCALATION * 100,
+    }
+    return render(request, 'lifetime_simulation.html', context)
+
+async def planner_events(request):
+    """Server-sent events with the planner hours and savings recomputed for the logged-in user (ASGI only)."""
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return HttpResponse("Authentication required.", status=401)
+    # 204 tells the browser to stop reconnecting
+    if not events.supports_streaming(request):
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(events.stream(user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@staff_member_required
+def upstream_quota(request):
+    return JsonResponse(quota.get_manager().metrics())
+
+def get_export_parameters(request):
+    export_format = request.GET.get('format', 'csv')
+    start = exports.parse_export_date(request.GET.get('start'))
+    end = exports.parse_export_date(request.GET.get('end'))
+    return export_format, start, end
+
+@login_required
+def export_weekly_planner(request):
+    try:
+        export_format, start, end = get_export_parameters(request)
+    except ValueError as e:
+        print("ValueError:", e)
+        return HttpResponse("Start and/or end dates are invalid.", status=400)
+    if export_format not in exports.FORMATS:
+        return HttpResponse("Export format is invalid.", status=400)
+    if export_format == 'parquet' and not exports.parquet_available():
+        return HttpResponse("Parquet export requires pyarrow.", status=400)
+
+    # Staff members export every user's planner
+    users = None if request.user.is_staff else [request.user]
+    queryset = exports.planner_queryset(users, start, end)
+    return exports.streaming_response('weekly_planner', exports.PLANNER_COLUMNS, exports.planner_rows(queryset), export_format)
+
+@login_required
+def export_irradiance(request):
+    try:
+        export_format, start, end = get_export_parameters(request)
+    except ValueError as e:
+        print("ValueError:", e)
+        return HttpResponse("Start and/or end dates are invalid.", status=400)
+    if export_format not in exports.FORMATS:
+        return HttpResponse("Export format is invalid.", status=400)
+    if export_format == 'parquet' and not exports.parquet_available():
+        return HttpResponse("Parquet export requires pyarrow.", status=400)
+
+    if request.user.is_staff:
+        queryset = exports.irradiance_queryset(start=start, end=end)
+    else:
+        user_profile = get_object_or_404(UserProfile, user=request.user)
+        # Without coordinates the location filter would be skipped and every archived location exported
+        if user_profile.latitude is None or user_profile.longitude is None:
+            return HttpResponse("Add your coordinates to export irradiance.", status=400)
+        latitude, longitude = climatology.snap(user_profile.latitude, user_profile.longitude)
+        queryset = exports.irradiance_queryset(latitude, longitude, start, end)
+    return exports.streaming_response('irradiance', exports.IRRADIANCE_COLUMNS, exports.irradiance_rows(queryset), export_format)
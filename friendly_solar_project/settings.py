@@ -37,7 +37,7 @@ SITE_ID = 1
 # Application definition
 
 INSTALLED_APPS = [
-    "myapp",
+    "friendly_solar_app",
     "allauth",
     "allauth.account",
     "allauth.socialaccount",
@@ -95,9 +95,31 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR , "db.sqlite3"),
+        # Keep connections open between requests and wait for the write lock instead of failing
+        "CONN_MAX_AGE": 600,
+        "OPTIONS": {
+            "timeout": 20,
+        },
     }
 }
 
+# Applied to every new SQLite connection by friendly_solar_app.database.
+# WAL lets readers proceed while a write is in progress.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 20000,
+}
+
+# Route forecast writes through a single writer thread that coalesces concurrent
+# users' updates into shared transactions.
+FORECAST_WRITER_ENABLED = True
+FORECAST_WRITER_MAX_BATCH = 50
+FORECAST_WRITER_MAX_DELAY = 0.05
+# Seconds a login waits for its forecast write; a write that takes longer still
+# completes in the background, and the forecast is refetched on the next login.
+FORECAST_WRITER_TIMEOUT = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -139,6 +161,31 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Forecast grid used to answer anonymous /calculate/ requests without upstream calls.
+# A smaller spacing lowers the interpolation error but needs more upstream calls per refresh:
+# every cell is one call, so 0.5 degrees (13 x 22 = 286 cells) refreshed every 3 hours with
+# `python manage.py refresh_forecast_grid` uses about 2,300 of OPEN_METEO_DAILY_QUOTA.
+FORECAST_GRID_BOUNDS = (49.0, 55.0, 14.0, 24.5)  # lat_min, lat_max, lon_min, lon_max
+FORECAST_GRID_SPACING = 0.5
+FORECAST_GRID_DAYS = 7
+FORECAST_GRID_PATH = os.path.join(BASE_DIR, "forecast_grid.joblib")
+
+# Stored user forecasts younger than this (in seconds) are not refetched on login.
+FORECAST_MAX_AGE = 3600
+
+# Budget for calls to open-meteo, shared by priority class (see friendly_solar_app.quota).
+# Background refreshes and archive backfills may not use the reserved share of the
+# bucket and of the daily quota, which is kept for interactive forecasts.
+OPEN_METEO_RATE_PER_MINUTE = 500
+OPEN_METEO_BURST = 100
+OPEN_METEO_DAILY_QUOTA = 10000
+OPEN_METEO_BACKGROUND_RESERVE = 0.2
+OPEN_METEO_BACKFILL_RESERVE = 0.5
+OPEN_METEO_INTERACTIVE_TIMEOUT = 5
+
+# Fitted feature scaler shared by every forecast (see `python manage.py fit_feature_scaler`).
+FEATURE_PIPELINE_PATH = os.path.join(BASE_DIR, "feature_pipeline.joblib")
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # FOR PRODUCTION! -> use SMTP backend to send out emails
 
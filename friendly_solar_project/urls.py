@@ -17,13 +17,14 @@ from allauth.account.views import LoginView, LogoutView, SignupView, PasswordCha
 
 from django.contrib import admin
 from django.urls import include, path
-from friendly_solar_app.views import calculate, display_result, user_profile, custom_logout, add_float_numbers, view_weekly_planner, create_appliance, add_appliance_to_weekly_planner, add_panel_surface, calculate_savings
+from friendly_solar_app.views import calculate, display_result, user_profile, custom_logout, add_float_numbers, view_weekly_planner, create_appliance, add_appliance_to_weekly_planner, bulk_add_appliances_to_weekly_planner, add_panel_surface, calculate_savings, export_weekly_planner, export_irradiance, lifetime_simulation, planner_events, upstream_quota
 
 from django.shortcuts import redirect
 
 
 urlpatterns = [
     path('', lambda request: redirect('calculate'), name='root'),
+    path("admin/upstream-quota/", upstream_quota, name='upstream_quota'),
     path("admin/", admin.site.urls),
     path('calculate/', calculate, name='calculate'),
     path('result/', display_result, name='result'),
@@ -41,7 +42,12 @@ urlpatterns = [
     path('accounts/profile/add-panel-surface/', add_panel_surface, name='add_panel_surface'),
     path('accounts/profile/view-weekly-planner/', view_weekly_planner, name='view_weekly_planner'),
     path('accounts/profile/add_appliance_to_weekly_planner/', add_appliance_to_weekly_planner, name='add_appliance_to_weekly_planner'),
+    path('accounts/profile/bulk_add_appliances_to_weekly_planner/', bulk_add_appliances_to_weekly_planner, name='bulk_add_appliances_to_weekly_planner'),
     path('accounts/profile/calculate-savings/', calculate_savings, name='calculate_savings'),
+    path('accounts/profile/events/', planner_events, name='planner_events'),
+    path('accounts/profile/lifetime-simulation/', lifetime_simulation, name='lifetime_simulation'),
+    path('accounts/profile/export/weekly-planner/', export_weekly_planner, name='export_weekly_planner'),
+    path('accounts/profile/export/irradiance/', export_irradiance, name='export_irradiance'),
     path('create_appliance/', create_appliance, name='create_appliance'),
     path('accounts/logout/', custom_logout, name='logout'),
     